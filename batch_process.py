@@ -0,0 +1,195 @@
+import matplotlib
+matplotlib.use("Agg")  # headless; workers never open a window
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from matplotlib.figure import Figure
+import numpy as np
+from config import CONFIG
+import process_data as pd
+
+# Batch reprocessing of saved captures:
+#   python batch_process.py gun_range/ --workers 4 --summary results.csv --png-dir pngs \
+#       --chrono gun_range/testing.txt
+# Directories are searched for --pattern, anything else is treated as a glob.
+
+SUMMARY_FIELDS = ["file", "max_velocity", "peak_power_db", "duration", "processing_time",
+                  "chrono_velocity", "error_percent", "error"]
+
+
+def find_captures(inputs, pattern="*.bin"):
+    """Expands directories and globs into a sorted list of capture files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, pattern)))
+        else:
+            files.update(path for path in glob.glob(item) if os.path.isfile(path))
+    return sorted(files)
+
+
+def read_chrono_file(file_name):
+    """
+    Reads chronograph velocities from a testing.txt style log.
+
+    Each test is a name line followed by "- Chrono: <m/s>" and "- Radar: <m/s>" lines;
+    tests without a chronograph reading are skipped.
+
+    Returns:
+        dict: Chronograph velocity (m/s) keyed by lower-case test name.
+    """
+    chrono = {}
+    test_name = None
+    with open(file_name) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if not line.startswith("-"):
+                test_name = line.lower()
+                continue
+            match = re.match(r"-\s*Chrono:\s*([0-9.]+)", line)
+            if match and test_name is not None:
+                chrono[test_name] = float(match.group(1))
+    return chrono
+
+
+def match_chrono(file_name, chrono):
+    """
+    Looks up the chronograph velocity for a capture. The capture's name must be the test
+    name, optionally followed by "_" and anything else (e.g. the GUI's timestamp).
+    """
+    stem = os.path.splitext(os.path.basename(file_name))[0].lower()
+    best = None
+    for test_name in chrono:
+        if stem == test_name or stem.startswith(test_name + "_"):
+            if best is None or len(test_name) > len(best):
+                best = test_name
+    return None if best is None else chrono[best]
+
+
+def configure_worker(overrides):
+    """Applies CONFIG overrides in a worker process."""
+    for name, value in overrides.items():
+        setattr(CONFIG, name, value)
+
+
+def process_capture(file_name, png_dir=None):
+    """
+    Analyzes one capture; runs in a worker process.
+
+    Returns:
+        dict: One summary row (see SUMMARY_FIELDS), without the chronograph columns.
+    """
+    row = {"file": file_name}
+    start = time.perf_counter()
+    try:
+        result = pd.analyze_capture(file_name, keep_spectrogram=True)
+        Sxx = result["Sxx"]
+        row["max_velocity"] = float(result["max_velocity"])
+        row["peak_power_db"] = None if Sxx is None or Sxx.size == 0 else float(10 * np.log10(np.max(Sxx) + 1e-10))
+        row["duration"] = pd.open_capture(file_name).duration
+        if png_dir is not None:
+            figure = Figure(figsize=(10, 6))
+            pd.plot_spectrogram(result, figure)
+            name = os.path.splitext(os.path.basename(file_name))[0]
+            figure.savefig(os.path.join(png_dir, f"{name}_spectrogram.png"))
+    except Exception as e:
+        row["error"] = f"{type(e).__name__}: {e}"
+    row["processing_time"] = time.perf_counter() - start
+    return row
+
+
+def write_summary(rows, file_name):
+    """Writes the summary as JSON if file_name ends in .json, CSV otherwise."""
+    if file_name.lower().endswith(".json"):
+        with open(file_name, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field) for field in SUMMARY_FIELDS})
+
+
+def run_batch(files, workers=None, png_dir=None, chrono=None, overrides=None):
+    """
+    Processes captures across a process pool.
+
+    Args:
+        files (list of str): Capture files.
+        workers (int, optional): Worker processes. Defaults to the number of CPUs.
+        png_dir (str, optional): Directory for spectrogram PNGs. None skips them.
+        chrono (dict, optional): Chronograph velocities from read_chrono_file.
+        overrides (dict, optional): CONFIG attributes to set in every worker.
+
+    Returns:
+        list of dict: One summary row per capture, in the order of files.
+    """
+    if png_dir is not None:
+        os.makedirs(png_dir, exist_ok=True)
+
+    rows = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=configure_worker, initargs=(overrides or {},)) as pool:
+        futures = {pool.submit(process_capture, file_name, png_dir): file_name for file_name in files}
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            rows[futures[future]] = row
+            status = row.get("error") or f"{row['max_velocity']:.1f} m/s"
+            print(f"[{done}/{len(files)}] {row['file']}: {status} ({row['processing_time']:.2f} s)")
+
+    rows = [rows[file_name] for file_name in files]
+    if chrono:
+        for row in rows:
+            chrono_velocity = match_chrono(row["file"], chrono)
+            row["chrono_velocity"] = chrono_velocity
+            if chrono_velocity and row.get("max_velocity") is not None:
+                row["error_percent"] = 100 * abs(row["max_velocity"] - chrono_velocity) / chrono_velocity
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Reprocess saved radar captures in parallel.")
+    parser.add_argument("inputs", nargs="+", help="capture files, directories or glob patterns")
+    parser.add_argument("--pattern", default="*.bin", help="file pattern used inside directories (default: *.bin)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: number of CPUs)")
+    parser.add_argument("--summary", default="batch_summary.csv", help="summary file, .csv or .json (default: batch_summary.csv)")
+    parser.add_argument("--png-dir", default=None, help="write a spectrogram PNG per capture to this directory")
+    parser.add_argument("--chrono", default=None, help="chronograph log in the gun_range/testing.txt format")
+    parser.add_argument("--decimation", type=int, default=None, help="override CONFIG.decimation")
+    parser.add_argument("--fft-size", type=int, default=None, help="override CONFIG.fft_size")
+    parser.add_argument("--fft-overlap", type=int, default=None, help="override CONFIG.fft_overlap")
+    args = parser.parse_args(argv)
+
+    files = find_captures(args.inputs, args.pattern)
+    if not files:
+        print("No captures found")
+        return 1
+
+    overrides = {}
+    for name in ("decimation", "fft_size", "fft_overlap"):
+        if getattr(args, name) is not None:
+            overrides[name] = getattr(args, name)
+    chrono = read_chrono_file(args.chrono) if args.chrono else None
+
+    start = time.perf_counter()
+    rows = run_batch(files, args.workers, args.png_dir, chrono, overrides)
+    write_summary(rows, args.summary)
+
+    errors = [row["error_percent"] for row in rows if row.get("error_percent") is not None]
+    print(f"Processed {len(rows)} captures in {time.perf_counter() - start:.1f} s, summary in {args.summary}")
+    if errors:
+        print(f"Chronograph comparison: {len(errors)} captures, mean error {np.mean(errors):.2f}%, max {np.max(errors):.2f}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
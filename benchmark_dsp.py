@@ -0,0 +1,291 @@
+import matplotlib
+matplotlib.use("Agg")  # plotting is timed headless
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import numpy as np
+from config import CONFIG
+import process_data as pd
+from synthetic_capture import synthetic_signal, write_synthetic_capture
+
+# Stage-level timing and memory of process_data on synthetic captures:
+#   python benchmark_dsp.py --decimations 2 10 80 --fft-sizes 512 1024 4096 --output bench.json
+# Every stage is timed as the best of --repeat runs, then run once more under tracemalloc
+# for its peak allocation. The velocity each setting measures is reported next to the
+# timings, so a faster change that loses accuracy shows up in the same table.
+
+RESULT_FIELDS = ["samp_rate", "decimation", "fft_size", "fft_overlap", "fft_backend", "fft_workers", "parallel_workers", "stage",
+                 "seconds", "peak_mb", "velocity", "error_percent"]
+
+
+def measure(function, repeat=3):
+    """
+    Times function() as the best of `repeat` runs, then measures its peak allocation.
+
+    Returns:
+        (float, float, object): Best time (in s), peak traced memory (in MB) and the
+        function's return value.
+    """
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak / 1e6, value
+
+
+class settings:
+    """Temporarily sets CONFIG attributes, restoring them on exit."""
+    def __init__(self, **overrides):
+        self.overrides = overrides
+
+    def __enter__(self):
+        self.saved = {name: getattr(CONFIG, name) for name in self.overrides}
+        for name, value in self.overrides.items():
+            setattr(CONFIG, name, value)
+
+    def __exit__(self, *exc):
+        for name, value in self.saved.items():
+            setattr(CONFIG, name, value)
+
+
+def draw_spectrogram(result, fft_size, fft_overlap):
+    """Renders the spectrogram off screen, the way the GUI would."""
+    with settings(fft_size=fft_size, fft_overlap=fft_overlap):
+        figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(figure)
+        pd.plot_spectrogram(result, figure)
+        figure.canvas.draw()
+
+
+def benchmark(velocity=40, samp_rates=(6e6,), duration=1.0, decimations=(2, 10, 80), fft_sizes=(512, 1024, 4096),
+              overlap_fractions=(0.5,), repeat=3, end_to_end=True, fft_backends=None, fft_workers=None,
+              parallel_workers=()):
+    """
+    Runs every stage over the grid of settings on a synthetic capture of a projectile at
+    `velocity`. Decimations that would put the projectile's Doppler above the decimated
+    Nyquist frequency are skipped. The spectrogram stage is repeated for every FFT backend
+    and worker count given (CONFIG's by default), and the decimation is also run through
+    filter_decimate_parallel for every count in parallel_workers.
+
+    Returns:
+        list of dict: One row per stage and setting (see RESULT_FIELDS).
+    """
+    rows = []
+    doppler = pd.velocity_to_doppler(velocity)
+    fft_backends = fft_backends or [CONFIG.fft_backend]
+    fft_workers = fft_workers or [CONFIG.fft_workers]
+
+    def record(stage, seconds, peak_mb, measured=None, **setting):
+        row = dict(setting, stage=stage, seconds=seconds, peak_mb=peak_mb)
+        accuracy = ""
+        if measured is not None:
+            row["velocity"] = float(measured)
+            row["error_percent"] = 100 * abs(measured - velocity) / velocity
+            accuracy = f"  {measured:8.2f} m/s ({row['error_percent']:.2f}%)"
+        rows.append(row)
+        label = " ".join(f"{key}={value:g}" if isinstance(value, (int, float)) else f"{key}={value}"
+                         for key, value in setting.items())
+        print(f"{stage:34s} {label:60s} {seconds * 1e3:9.1f} ms {peak_mb:8.1f} MB{accuracy}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for samp_rate in samp_rates:
+            signal = synthetic_signal(velocity, samp_rate, duration)
+            capture_file = os.path.join(tmp, f"synthetic_{samp_rate:g}.bin")
+            if end_to_end:
+                write_synthetic_capture(capture_file, velocity, samp_rate, duration)
+
+            seconds, peak, high_passed = measure(lambda: pd.highpass_chebyshev(signal, CONFIG.high_pass_cutoff, samp_rate), repeat)
+            record("highpass_chebyshev", seconds, peak, samp_rate=samp_rate)
+
+            for decimation in decimations:
+                rate = samp_rate / decimation
+                if doppler >= rate / 2:
+                    print(f"skipping decimation {decimation}: {velocity} m/s is above the {rate / 2:g} Hz Nyquist frequency")
+                    continue
+                setting = dict(samp_rate=samp_rate, decimation=decimation)
+
+                seconds, peak, _ = measure(lambda: pd.lowpass_filter_decimate(high_passed, 0.25 * rate, samp_rate, decimation), repeat)
+                record("lowpass_filter_decimate", seconds, peak, **setting)
+                seconds, peak, decimated = measure(lambda: pd.decimate_multistage(high_passed, decimation, samp_rate, 0.25 * rate), repeat)
+                record("decimate_multistage", seconds, peak, **setting)
+                for workers in parallel_workers:
+                    with settings(parallel_workers=workers, parallel_min_samples=0):
+                        pd.parallel_pool()  # starts the workers, outside the timing
+                        seconds, peak, _ = measure(lambda: pd.filter_decimate_parallel(high_passed, decimation, samp_rate, 0.25 * rate), repeat)
+                    record("filter_decimate_parallel", seconds, peak, parallel_workers=workers, **setting)
+
+                for fft_size in fft_sizes:
+                    for fraction in overlap_fractions:
+                        fft_overlap = int(fft_size * fraction)
+                        if fft_size > len(decimated):
+                            continue
+                        setting = dict(samp_rate=samp_rate, decimation=decimation, fft_size=fft_size, fft_overlap=fft_overlap)
+
+                        for backend in fft_backends:
+                            for workers in fft_workers:
+                                with settings(fft_backend=backend, fft_workers=workers):
+                                    seconds, peak, (freqs, times, Sxx, max_freqs) = measure(
+                                        lambda: pd.compute_spectrogram_and_max_freq(decimated, rate, fft_size, fft_overlap), repeat)
+                                measured = float(np.max(np.abs(pd.doppler_to_velocity(max_freqs))))
+                                record("compute_spectrogram_and_max_freq", seconds, peak, measured,
+                                       fft_backend=backend, fft_workers=workers, **setting)
+
+                        result = {"Sxx": Sxx, "times": times, "velocity_bins": freqs, "sampling_rate": rate}
+                        seconds, peak, _ = measure(lambda: draw_spectrogram(result, fft_size, fft_overlap), repeat)
+                        record("plot_spectrogram", seconds, peak, **setting)
+
+                        if end_to_end:
+                            with settings(decimation=decimation, fft_size=fft_size, fft_overlap=fft_overlap):
+                                seconds, peak, result = measure(lambda: pd.analyze_capture(capture_file, keep_spectrogram=False), repeat)
+                            record("analyze_capture", seconds, peak, float(result["max_velocity"]), **setting)
+    return rows
+
+
+def check_precision(velocities=(40, 300, 900, 1800), samp_rate=6e6, duration=1.0, decimations=(2, 10, 80), fft_sizes=(512, 1024, 4096)):
+    """
+    Compares analyze_capture in single and double precision on synthetic captures against
+    process_data.SINGLE_PRECISION_TOLERANCE. Settings whose Nyquist frequency is below the
+    projectile's Doppler are skipped.
+
+    Returns:
+        (list of dict, bool): One row per setting, and whether every setting was within the bound.
+    """
+    rows = []
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for velocity in velocities:
+            capture_file = os.path.join(tmp, f"synthetic_{velocity:g}.bin")
+            write_synthetic_capture(capture_file, velocity, samp_rate, duration)
+            for decimation in decimations:
+                if pd.velocity_to_doppler(velocity) >= samp_rate / decimation / 2:
+                    continue
+                for fft_size in fft_sizes:
+                    results = {}
+                    for precision in ("double", "single"):
+                        with settings(decimation=decimation, fft_size=fft_size, fft_overlap=fft_size // 2, dsp_precision=precision):
+                            start = time.perf_counter()
+                            result = pd.analyze_capture(capture_file, keep_spectrogram=False)
+                            results[precision] = (float(result["max_velocity"]), time.perf_counter() - start)
+
+                    (double, double_time), (single, single_time) = results["double"], results["single"]
+                    difference = abs(single - double) / double
+                    ok = difference <= pd.SINGLE_PRECISION_TOLERANCE
+                    passed = passed and ok
+                    rows.append({"velocity": velocity, "decimation": decimation, "fft_size": fft_size, "double": double,
+                                 "single": single, "relative_difference": difference, "double_seconds": double_time,
+                                 "single_seconds": single_time, "within_bound": ok})
+                    print(f"{velocity:7g} m/s  decimation={decimation:<3d} fft_size={fft_size:<5d} double {double:9.3f}  "
+                          f"single {single:9.3f}  difference {difference:.2e}  {'ok' if ok else 'OUT OF BOUND'}")
+    return rows, passed
+
+
+def check_accuracy(velocities=(-1800, -300, -40, 40, 300, 1800), samp_rate=6e6, duration=1.0, decimations=(2, 10, 80),
+                   fft_size=1024, engines=("fft", "zoom"), tolerance=0.01):
+    """
+    Checks the signed velocity analyze_capture measures against the synthetic truth, for
+    projectiles approaching and receding and every spectral engine. Settings whose Nyquist
+    frequency is below the projectile's Doppler are skipped.
+
+    Returns:
+        (list of dict, bool): One row per setting, and whether every setting was within tolerance.
+    """
+    rows = []
+    passed = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for velocity in velocities:
+            capture_file = os.path.join(tmp, f"synthetic_{velocity:g}.bin")
+            write_synthetic_capture(capture_file, velocity, samp_rate, duration)
+            for decimation in decimations:
+                if abs(pd.velocity_to_doppler(velocity)) >= samp_rate / decimation / 2:
+                    continue
+                for engine in engines:
+                    with settings(decimation=decimation, fft_size=fft_size, fft_overlap=fft_size // 2, spectral_engine=engine):
+                        result = pd.analyze_capture(capture_file, keep_spectrogram=False)
+                    measured = float(result["velocities"][np.argmax(np.abs(result["velocities"]))])
+                    error = abs(measured - velocity) / abs(velocity)
+                    ok = error <= tolerance
+                    passed = passed and ok
+                    rows.append({"velocity": velocity, "decimation": decimation, "spectral_engine": engine,
+                                 "measured": measured, "error_percent": 100 * error, "within_bound": ok})
+                    print(f"{velocity:7g} m/s  decimation={decimation:<3d} {engine:5s} measured {measured:9.3f}  "
+                          f"error {100 * error:.2f}%  {'ok' if ok else 'OUT OF BOUND'}")
+    return rows, passed
+
+
+def write_results(rows, file_name):
+    """Writes the results as JSON if file_name ends in .json, CSV otherwise."""
+    if file_name.lower().endswith(".json"):
+        with open(file_name, "w") as f:
+            json.dump(rows, f, indent=2)
+        return
+    fields = list(rows[0]) if rows and "stage" not in rows[0] else RESULT_FIELDS
+    with open(file_name, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({field: row.get(field) for field in fields})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time and memory-profile the process_data stages on synthetic captures.")
+    parser.add_argument("--velocity", type=float, default=40, help="projectile velocity in m/s (default: 40)")
+    parser.add_argument("--samp-rates", type=float, nargs="+", default=[CONFIG.samp_rate], help="sampling rates in Hz")
+    parser.add_argument("--duration", type=float, default=1.0, help="capture length in s (default: 1)")
+    parser.add_argument("--decimations", type=int, nargs="+", default=[2, 10, 80])
+    parser.add_argument("--fft-sizes", type=int, nargs="+", default=[512, 1024, 4096])
+    parser.add_argument("--overlap-fractions", type=float, nargs="+", default=[0.5], help="fft_overlap as a fraction of fft_size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage; the best is reported (default: 3)")
+    parser.add_argument("--fft-backends", nargs="+", default=None, help="FFT backends to compare (default: CONFIG.fft_backend)")
+    parser.add_argument("--fft-workers", type=int, nargs="+", default=None, help="FFT thread counts to compare (default: CONFIG.fft_workers)")
+    parser.add_argument("--parallel-workers", type=int, nargs="+", default=[],
+                        help="also time filter_decimate_parallel with these worker process counts")
+    parser.add_argument("--no-end-to-end", action="store_true", help="skip the analyze_capture runs")
+    parser.add_argument("--output", default=None, help="write the results to a .csv or .json file")
+    parser.add_argument("--check-precision", action="store_true",
+                        help="compare single against double precision instead of timing stages; exits 1 if out of bound")
+    parser.add_argument("--check-accuracy", action="store_true",
+                        help="check signed velocities, approaching and receding, for every spectral engine; exits 1 if off by over 1%%")
+    args = parser.parse_args(argv)
+
+    if args.check_accuracy:
+        rows, passed = check_accuracy(samp_rate=args.samp_rates[0], duration=args.duration, decimations=args.decimations)
+        if args.output:
+            write_results(rows, args.output)
+        print(f"velocities {'within' if passed else 'OUTSIDE'} 1% of the truth")
+        return 0 if passed else 1
+
+    if args.check_precision:
+        rows, passed = check_precision(samp_rate=args.samp_rates[0], duration=args.duration,
+                                       decimations=args.decimations, fft_sizes=args.fft_sizes)
+        if args.output:
+            write_results(rows, args.output)
+        print(f"single precision {'within' if passed else 'OUTSIDE'} the {pd.SINGLE_PRECISION_TOLERANCE:.1%} bound")
+        return 0 if passed else 1
+
+    rows = benchmark(args.velocity, args.samp_rates, args.duration, args.decimations, args.fft_sizes,
+                     args.overlap_fractions, args.repeat, not args.no_end_to_end, args.fft_backends, args.fft_workers,
+                     args.parallel_workers)
+    if args.output:
+        write_results(rows, args.output)
+        print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+import numpy as np
+import json
+import struct
+from datetime import datetime
+from config import CONFIG
+
+# Capture files start with a fixed preamble (magic, format version, header length) and a
+# JSON header, zero-padded so the complex64 payload begins on a page boundary and can be
+# memory-mapped in place. Files without the magic are legacy raw complex64 dumps.
+CAPTURE_MAGIC = b"RADARCAP"
+CAPTURE_VERSION = 1
+HEADER_ALIGNMENT = 4096
+PREAMBLE = struct.Struct("<8sII")
+
+
+def capture_metadata(trigger_index=None, n_samples=None, decimation=1, samp_rate=None):
+    """
+    Describes a capture taken with the current CONFIG settings.
+
+    Args:
+        trigger_index (int, optional): Sample index of the trigger within the capture.
+        n_samples (int, optional): Number of samples in the payload.
+        decimation (int, optional): Decimation already applied to the stored samples. Defaults to 1.
+        samp_rate (float, optional): Rate the samples came in at, before that decimation.
+            Defaults to CONFIG.samp_rate.
+
+    Returns:
+        dict: The header fields.
+    """
+    return {
+        "samp_rate": CONFIG.samp_rate if samp_rate is None else samp_rate,
+        "rf_freq": CONFIG.rf_freq,
+        "transmit_freq": CONFIG.transmit_freq,
+        "carrier_freq": CONFIG.carrier_freq,
+        "sdr_gain": CONFIG.sdr_gain,
+        "decimation": decimation,
+        "processing_decimation": CONFIG.decimation,
+        "high_pass_cutoff": CONFIG.high_pass_cutoff,
+        "trigger_index": trigger_index,
+        "n_samples": n_samples,
+        "timestamp": datetime.now().isoformat(),
+        "dtype": "complex64",
+    }
+
+
+def write_capture_header(f, metadata):
+    """
+    Writes the capture preamble and JSON header, padded so the payload that follows is
+    page aligned.
+    """
+    header = json.dumps(metadata).encode("utf-8")
+    size = PREAMBLE.size + len(header)
+    padded = -(-size // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+    f.write(PREAMBLE.pack(CAPTURE_MAGIC, CAPTURE_VERSION, len(header)))
+    f.write(header)
+    f.write(b"\0" * (padded - size))
+    return padded
+
+
+def read_capture_header(f):
+    """
+    Reads the header at the start of an open capture file.
+
+    Returns:
+        (dict or None, int): The header fields (None for a legacy raw capture) and the byte
+        offset of the payload.
+    """
+    preamble = f.read(PREAMBLE.size)
+    if len(preamble) < PREAMBLE.size:
+        return None, 0
+    magic, version, header_length = PREAMBLE.unpack(preamble)
+    if magic != CAPTURE_MAGIC:
+        return None, 0
+    if version > CAPTURE_VERSION:
+        raise ValueError(f"capture format version {version} is newer than this reader ({CAPTURE_VERSION})")
+
+    metadata = json.loads(f.read(header_length).decode("utf-8"))
+    size = PREAMBLE.size + header_length
+    return metadata, -(-size // HEADER_ALIGNMENT) * HEADER_ALIGNMENT
+
+
+class CaptureReader:
+    """
+    Lazy, sliceable access to a capture file backed by np.memmap.
+
+    Nothing is read when the capture is opened; slicing only touches the pages that hold
+    the requested samples, so working on the region around a shot is fast even for long
+    recordings.
+    """
+    def __init__(self, file_name, sampling_rate=None):
+        self.file_name = file_name
+        self.data_type = np.complex64
+
+        item_size = np.dtype(self.data_type).itemsize
+        with open(file_name, "rb") as f:
+            self.metadata, self.offset = read_capture_header(f)
+            f.seek(0, 2)
+            n_samples = (f.tell() - self.offset) // item_size
+
+        metadata = self.metadata or {}
+        # the stored rate is the SDR rate divided by any decimation done before saving
+        self.decimation = int(metadata.get("decimation", 1))
+        if sampling_rate is None:
+            sampling_rate = metadata.get("samp_rate", CONFIG.samp_rate) / self.decimation
+        self.sampling_rate = sampling_rate
+        self.carrier_freq = metadata.get("carrier_freq", CONFIG.carrier_freq)
+        self.trigger_index = metadata.get("trigger_index")
+
+        if n_samples <= 0:
+            # np.memmap cannot map an empty file
+            self.data = np.zeros(0, dtype=self.data_type)
+        else:
+            self.data = np.memmap(file_name, dtype=self.data_type, mode="r", offset=self.offset, shape=(n_samples,))
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return self.data[index]
+
+    @property
+    def duration(self):
+        """Length of the capture in seconds."""
+        return len(self.data) / self.sampling_rate
+
+    def sample_index(self, time_offset):
+        """Converts a time offset (in s) from the start of the capture to a sample index."""
+        return min(max(int(round(time_offset * self.sampling_rate)), 0), len(self.data))
+
+    def samples(self, start=0, stop=None):
+        """Returns samples [start, stop) as a read-only view of the file."""
+        return self.data[start:stop]
+
+    def time_slice(self, start_time=None, stop_time=None):
+        """
+        Returns the samples between two time offsets (in s) as a read-only view of the file.
+
+        Either end may be None to run to the start or end of the capture.
+        """
+        start = 0 if start_time is None else self.sample_index(start_time)
+        stop = len(self.data) if stop_time is None else self.sample_index(stop_time)
+        return self.data[start:stop]
+
+    @property
+    def trigger_time(self):
+        """Time of the trigger in seconds from the start of the capture, None if unknown."""
+        if self.trigger_index is None:
+            return None
+        return self.trigger_index / self.sampling_rate
+
+    def remaining_decimation(self, decimation):
+        """Decimation still needed to bring the stored samples down to an overall factor."""
+        return max(1, int(round(decimation / self.decimation)))
+
+    def trigger_window(self, before, after):
+        """
+        Returns the samples from `before` seconds ahead of the trigger to `after` seconds
+        past it, as a read-only view. Falls back to the whole capture if no trigger is stored.
+        """
+        if self.trigger_index is None:
+            return self.data[:]
+        start = self.sample_index(self.trigger_time - before)
+        stop = self.sample_index(self.trigger_time + after)
+        return self.data[start:stop]
+
+    def blocks(self, block_size, start=0, stop=None):
+        """Yields samples [start, stop) as consecutive views of at most block_size samples."""
+        if stop is None:
+            stop = len(self.data)
+        for i in range(start, stop, block_size):
+            yield self.data[i:min(i + block_size, stop)]
+
+
+def open_capture(file_name, sampling_rate=None):
+    """Opens a capture file for lazy reading."""
+    return CaptureReader(file_name, sampling_rate)
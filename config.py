@@ -2,15 +2,80 @@
 class CONFIG():
 
     symetric_record_time = 2
+    # capture length either side of the trigger, in seconds
+    pre_trigger_time = symetric_record_time
+    post_trigger_time = symetric_record_time
     output_file_prefix = "default"
     file_name = output_file_prefix + ".bin"
     rf_freq = 1000000000
     samp_rate = 6000000
     transmit_freq = 1500000
+    carrier_freq = 85e9
     sdr_gain = 27
     #decimation=2
     decimation = 80
     fft_size = 1024
     fft_overlap = 512
     #high_pass_cutoff = 75000
-    high_pass_cutoff = 750
\ No newline at end of file
+    high_pass_cutoff = 750
+
+    # sub-bin peak estimate: "argmax", "parabolic" (magnitude) or "gaussian" (log power)
+    peak_estimator = "gaussian"
+
+    # both engines search only the Doppler band of the velocities a projectile can have;
+    # "fft" computes every bin, "zoom" only the band's, at zoom_resolution m/s or finer
+    spectral_engine = "fft"
+    min_velocity = 30
+    max_velocity = 2000
+    zoom_resolution = 5.0
+
+    # "single" keeps filtering, decimation and the STFT in float32/complex64, "double" in
+    # float64/complex128 (see process_data.SINGLE_PRECISION_TOLERANCE for the accuracy cost)
+    dsp_precision = "double"
+
+    # FFT library for the spectrogram: "scipy" or "pyfftw" (optional, falls back to scipy),
+    # and threads per FFT call (-1 for one per CPU)
+    fft_backend = "scipy"
+    fft_workers = -1
+
+    # process captures block by block so memory use does not grow with recording time
+    streaming = False
+    stream_block_size = 1 << 20
+
+    # filter and decimate across worker processes sharing the capture in shared memory,
+    # -1 workers for one per CPU; captures shorter than parallel_min_samples per worker
+    # are split into fewer segments. The workers are forked, so start them
+    # (process_data.parallel_pool or warm_design_cache) before any threads, flowgraph or
+    # Tk window, as gui.main does; scripts need no main guard
+    parallel_filtering = False
+    parallel_workers = -1
+    parallel_min_samples = 1 << 20
+
+    # live velocity estimate inside the flowgraph; live_decimation None decimates as far
+    # as the Doppler of max_velocity allows at the current samp_rate
+    live_decimation = None
+    live_threshold_db = 15
+
+    # trigger automatically on Doppler energy, no button or BNC line needed
+    software_trigger = False
+    software_trigger_threshold_db = 12
+    software_trigger_holdoff = 2.0
+
+    # only compute the spectrogram around bursts of Doppler energy (not with streaming,
+    # which has to compute every frame as the blocks arrive)
+    roi_gating = True
+    roi_threshold_db = 10
+    roi_margin = 0.01
+
+    # replay a saved capture through the flowgraph instead of streaming from the SDR
+    replay_file = None
+    replay_throttle = True  # pace the replay at samp_rate; False runs as fast as possible
+    replay_loop = True
+
+    # filter and decimate by `decimation` inside the flowgraph, so the capture buffer and
+    # files hold decimated samples; False stores the full SDR rate
+    flowgraph_decimation = True
+
+    # keep the flowgraph and SDR streams running between shots; the transmitter stays on
+    # while disarmed, so it is opt-in
+    persistent_session = False
@@ -0,0 +1,123 @@
+import numpy as np
+import scipy.fft
+from gnuradio import gr
+import pmt
+import threading
+from numpy.lib.stride_tricks import sliding_window_view
+from process_data import doppler_to_velocity, interpolate_peaks, stft_window
+
+class doppler_velocity(gr.sync_block):
+    """
+    Live Doppler velocity estimate from the (already decimated) mixer output.
+
+    Runs an overlapped FFT over the stream, takes each frame's strongest bin away from DC,
+    and converts it to a velocity. Frames whose peak is less than threshold_db above the
+    frame's median power count as no target. The latest frame and the running max since the
+    last reset() can be read from the block. Each work() call publishes the velocity and
+    peak power of every frame it completed, plus the latest values and running max, on the
+    "velocity" message port. Frames are transformed in single precision; the peak search
+    does not need more.
+    """
+    def __init__(self, samp_rate=3000000, fft_size=1024, fft_overlap=512, carrier_freq=85e9, min_freq=750, threshold_db=15):
+        gr.sync_block.__init__(self,
+            name="Doppler Velocity",
+            in_sig=[np.complex64],
+            out_sig=None)
+
+        self.message_port_register_out(pmt.intern("velocity"))
+
+        self.lock = threading.Lock()
+        self.fft_size = fft_size
+        self.fft_overlap = fft_overlap
+        # an overlap of a whole frame or more would never advance; hop at least one sample
+        self.step = max(1, fft_size - fft_overlap)
+        self.carrier_freq = carrier_freq
+        self.min_freq = min_freq
+        self.threshold_db = threshold_db
+        self.samp_rate = samp_rate
+        self.pending = np.zeros(0, dtype=np.complex64)
+        self._update_bins()
+        self.reset()
+
+    def _update_bins(self):
+        # window, bin frequencies and search mask for the current settings; call with the lock held
+        self.window = stft_window(self.fft_size).astype(np.float32)
+        self.freqs = np.fft.fftshift(np.fft.fftfreq(self.fft_size, 1 / self.samp_rate))
+        # bins around DC hold carrier leakage and clutter, never a projectile
+        self.search_mask = np.abs(self.freqs) >= self.min_freq
+
+    def set_samp_rate(self, samp_rate):
+        with self.lock:
+            self.samp_rate = samp_rate
+            self._update_bins()
+
+    def set_fft_size(self, fft_size, fft_overlap):
+        with self.lock:
+            self.fft_size = fft_size
+            self.fft_overlap = fft_overlap
+            self.step = max(1, fft_size - fft_overlap)
+            self._update_bins()
+
+    def set_min_freq(self, min_freq):
+        with self.lock:
+            self.min_freq = min_freq
+            self._update_bins()
+
+    def set_threshold_db(self, threshold_db):
+        with self.lock:
+            self.threshold_db = threshold_db
+
+    def reset(self):
+        """Clears the running max, e.g. when the radar is re-armed."""
+        with self.lock:
+            self.velocity = 0.0
+            self.peak_power_db = -np.inf
+            self.max_velocity = 0.0
+            self.frames = 0
+
+    def work(self, input_items, output_items):
+        in_data = input_items[0]
+
+        with self.lock:
+            self.pending = np.concatenate((self.pending, in_data))
+            if len(self.pending) < self.fft_size:
+                return len(in_data)
+
+            n_frames = (len(self.pending) - self.fft_size) // self.step + 1
+            frames = sliding_window_view(self.pending, self.fft_size)[::self.step][:n_frames]
+            power = np.fft.fftshift(np.abs(scipy.fft.fft(frames * self.window, axis=1)) ** 2, axes=1)
+            self.pending = self.pending[n_frames * self.step:]
+
+            power = power * self.search_mask
+            indices = np.argmax(power, axis=1)
+            peaks = power[np.arange(n_frames), indices]
+            floors = np.median(power, axis=1)
+            detected = peaks > floors * 10 ** (self.threshold_db / 10)
+
+            peak_freqs = self.freqs[indices] + interpolate_peaks(power, indices) * (self.freqs[1] - self.freqs[0])
+            velocities = doppler_to_velocity(peak_freqs, self.carrier_freq) * detected
+            peak_powers_db = 10 * np.log10(peaks.astype(np.float64) + 1e-20)
+            self.velocity = float(velocities[-1])
+            self.peak_power_db = float(peak_powers_db[-1])
+            self.max_velocity = max(self.max_velocity, float(np.max(np.abs(velocities))))
+            self.frames += n_frames
+
+            summary = pmt.make_dict()
+            summary = pmt.dict_add(summary, pmt.intern("velocities"), pmt.init_f64vector(n_frames, velocities.tolist()))
+            summary = pmt.dict_add(summary, pmt.intern("peak_powers_db"), pmt.init_f64vector(n_frames, peak_powers_db.tolist()))
+            summary = pmt.dict_add(summary, pmt.intern("velocity"), pmt.from_double(self.velocity))
+            summary = pmt.dict_add(summary, pmt.intern("peak_power_db"), pmt.from_double(self.peak_power_db))
+            summary = pmt.dict_add(summary, pmt.intern("max_velocity"), pmt.from_double(self.max_velocity))
+
+        self.message_port_pub(pmt.intern("velocity"), summary)
+        return len(in_data)
+
+    def stats(self):
+        """Returns the latest frame's velocity and peak power and the running max."""
+        with self.lock:
+            return {
+                "velocity": self.velocity,
+                "peak_power_db": self.peak_power_db,
+                "max_velocity": self.max_velocity,
+                "frames": self.frames,
+            }
@@ -0,0 +1,58 @@
+import os
+import contextlib
+import scipy.fft
+from config import CONFIG
+
+# pyFFTW is optional; without it the "pyfftw" backend falls back to scipy's own FFT
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft
+except ImportError:
+    pyfftw = None
+
+_warned = False
+
+
+def available_backends():
+    """FFT backends that can be used in this install."""
+    return ["scipy", "pyfftw"] if pyfftw is not None else ["scipy"]
+
+
+def fft_workers():
+    """Worker threads per FFT call from CONFIG.fft_workers; -1 means one per CPU."""
+    workers = CONFIG.fft_workers
+    if workers is None or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+
+def fft_backend():
+    """
+    Context manager that routes every scipy.fft call made inside it, including the ones
+    scipy.signal.spectrogram and ZoomFFT make, through CONFIG.fft_backend with
+    CONFIG.fft_workers threads.
+
+    "scipy" is scipy's bundled pocketfft, which keeps its own plan cache. "pyfftw" uses
+    FFTW with pyFFTW's plan cache turned on, so a plan is built once per FFT size and
+    reused for every later frame and capture. If pyFFTW is not installed, "pyfftw" falls
+    back to "scipy" with a one-time warning.
+    """
+    global _warned
+    stack = contextlib.ExitStack()
+    workers = fft_workers()
+
+    if CONFIG.fft_backend == "pyfftw":
+        if pyfftw is None:
+            if not _warned:
+                print("pyFFTW is not installed, using scipy's FFT")
+                _warned = True
+        else:
+            pyfftw.interfaces.cache.enable()
+            pyfftw.interfaces.cache.set_keepalive_time(60)
+            pyfftw.config.NUM_THREADS = workers
+            stack.enter_context(scipy.fft.set_backend(pyfftw.interfaces.scipy_fft))
+    elif CONFIG.fft_backend != "scipy":
+        raise ValueError(f"unknown FFT backend: {CONFIG.fft_backend}")
+
+    stack.enter_context(scipy.fft.set_workers(workers))
+    return stack
@@ -1,24 +1,205 @@
 import numpy as np
 from gnuradio import gr
-from collections import deque
+import pmt
+import threading
+import time
+
+LATENCY_BUCKETS = 24  # work() latency histogram bins: [0, 1), [1, 2), [2, 4) ... us
 
 class fifo_queue(gr.sync_block):
-    def __init__(self, capacity=4000000):
+    """
+    Fixed-size ring buffer that holds the most recent `capacity` samples of the stream.
+
+    Samples are stored in a preallocated np.complex64 array so work() only does
+    bulk slice copies, never per-sample Python work.
+
+    The first "trigger" stream tag (see trigger_tagger) marks the trigger sample. The ring
+    keeps filling for exactly post_trigger samples past it, then freezes itself and sets
+    capture_complete; trigger_index is the trigger's position in segments().
+
+    stats() reports the block's health since the last reset: samples received, how long
+    each work() call took (a histogram with power-of-two microsecond bins) and how many
+    stream discontinuities the source flagged. The SDR source stamps an "rx_time" tag on
+    its first sample and again after every overflow, so each later one counts as an overflow.
+    """
+    def __init__(self, capacity=4000000, post_trigger=2000000):
         gr.sync_block.__init__(self,
             name="FIFO Queue",
             in_sig=[np.complex64],
             out_sig=None)
 
-        self.capacity = capacity
-        self.buffer = deque(maxlen=capacity)
         self.data_type = np.complex64
+        self.trigger_key = pmt.intern("trigger")
+        self.lock = threading.Lock()
+        self.capture_complete = threading.Event()  # set once the ring is frozen
+        self.post_trigger = int(post_trigger)
+        self.rx_time_key = pmt.intern("rx_time")
+        self.rx_time_seen = False
+        self.set_capacity(capacity)
         print("Buffer initialized")
 
+    def set_capacity(self, capacity):
+        """Reallocates the ring for a new capacity, discarding anything stored."""
+        with self.lock:
+            self.capacity = int(capacity)
+            self.buffer = np.zeros(self.capacity, dtype=self.data_type)
+            self.write_index = 0  # next position to write in the ring
+            self.fill_level = 0   # number of valid samples in the ring
+            self.frozen = False   # while set, incoming samples are dropped
+            self._clear_trigger()
+            self._clear_stats()
+
+    def set_post_trigger(self, post_trigger):
+        """Number of samples kept after the trigger sample, used from the next trigger on."""
+        with self.lock:
+            self.post_trigger = int(post_trigger)
+
+    def reset(self):
+        """Empties the ring without reallocating it and resumes capturing."""
+        with self.lock:
+            self.write_index = 0
+            self.fill_level = 0
+            self.frozen = False
+            self._clear_trigger()
+            self._clear_stats()
+
+    def _clear_stats(self):
+        self.reset_time = time.monotonic()
+        self.samples_received = 0
+        self.work_calls = 0
+        self.latency_histogram = np.zeros(LATENCY_BUCKETS, dtype=np.int64)
+        self.max_latency = 0.0
+        self.overflows = 0
+
+    def stats(self):
+        """Returns the acquisition counters since the last reset (see the class docstring)."""
+        with self.lock:
+            return {
+                "time_since_reset": time.monotonic() - self.reset_time,
+                "samples_received": self.samples_received,
+                "work_calls": self.work_calls,
+                "latency_histogram_us": self.latency_histogram.tolist(),
+                "max_latency": self.max_latency,
+                "overflows": self.overflows,
+                "fill_level": self.fill_level,
+                "capacity": self.capacity,
+                "frozen": self.frozen,
+            }
+
+    def _record_work(self, n, started):
+        latency = time.perf_counter() - started
+        bucket = min(int(latency * 1e6).bit_length(), LATENCY_BUCKETS - 1)
+        self.latency_histogram[bucket] += 1
+        self.max_latency = max(self.max_latency, latency)
+        self.work_calls += 1
+        self.samples_received += n
+
+    def _clear_trigger(self):
+        self.trigger_offset = None  # stream offset of the trigger sample
+        self.trigger_source = None
+        self.stop_offset = None     # stream offset at which the ring freezes itself
+        self.end_offset = None      # stream offset just past the newest stored sample
+        self.capture_complete.clear()
+
+    @property
+    def trigger_index(self):
+        """Position of the trigger sample in segments(), None before a trigger."""
+        with self.lock:
+            if self.trigger_offset is None or self.end_offset is None:
+                return None
+            index = self.trigger_offset - (self.end_offset - self.fill_level)
+            return min(max(index, 0), self.fill_level)
+
+    def freeze(self):
+        """
+        Stops writing into the ring and returns its contents as views (see segments()).
+
+        The views stay valid until reset() or set_capacity() is called, so they can be
+        written to disk without copying the capture first.
+        """
+        with self.lock:
+            self.frozen = True
+            self.capture_complete.set()
+            return self._segments()
 
     def work(self, input_items, output_items):
+        started = time.perf_counter()
         in_data = input_items[0]
-        #print(len(in_data))
+        n = len(in_data)
+
+        with self.lock:
+            for tag in self.get_tags_in_window(0, 0, n, self.rx_time_key):
+                if self.rx_time_seen:
+                    self.overflows += 1
+                self.rx_time_seen = True
+
+            if self.frozen:
+                self._record_work(n, started)
+                return n
+
+            start = self.nitems_read(0)
+            if self.trigger_offset is None:
+                tags = self.get_tags_in_window(0, 0, n, self.trigger_key)
+                if tags:
+                    # the tag value holds the trigger sample, which may precede the tag
+                    self.trigger_offset = pmt.to_uint64(tags[0].value)
+                    self.trigger_source = pmt.symbol_to_string(tags[0].srcid)
+                    self.stop_offset = max(self.trigger_offset + self.post_trigger, start)
+
+            # only store up to the last post-trigger sample
+            stop = n
+            if self.stop_offset is not None:
+                stop = min(n, self.stop_offset - start)
+            self._store(in_data[:stop])
+            self.end_offset = start + stop
+
+            if self.stop_offset is not None and self.end_offset >= self.stop_offset:
+                self.frozen = True
+                self.capture_complete.set()
+
+            self._record_work(n, started)
+
+        return n
+
+    def _store(self, in_data):
+        n = len(in_data)
+        capacity = self.capacity
+
+        # only the newest `capacity` samples can survive this call
+        if n >= capacity:
+            self.buffer[:] = in_data[n - capacity:]
+            self.write_index = 0
+            self.fill_level = capacity
+            return
+
+        # copy in at most two slices, wrapping around the end of the ring
+        first = min(n, capacity - self.write_index)
+        self.buffer[self.write_index:self.write_index + first] = in_data[:first]
+        self.buffer[:n - first] = in_data[first:]
+
+        self.write_index = (self.write_index + n) % capacity
+        self.fill_level = min(self.fill_level + n, capacity)
+
+    def _segments(self):
+        start = (self.write_index - self.fill_level) % self.capacity
+        if start + self.fill_level <= self.capacity:
+            return [self.buffer[start:start + self.fill_level]]
+        return [self.buffer[start:], self.buffer[:self.write_index]]
+
+    def segments(self):
+        """
+        Returns the stored samples, oldest first, as at most two views into the ring.
+
+        The views share memory with the ring, so they are only stable while nothing
+        is writing to the block (e.g. after the flowgraph has been stopped).
+        """
+        with self.lock:
+            return self._segments()
 
-        self.buffer.extend(in_data)
+    def snapshot(self):
+        """Returns a copy of the stored samples in time order."""
+        with self.lock:
+            return np.concatenate(self._segments())
 
-        return len(input_items[0])
\ No newline at end of file
+    def __len__(self):
+        return self.fill_level
\ No newline at end of file
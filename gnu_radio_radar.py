@@ -11,7 +11,12 @@ from gnuradio.eng_arg import eng_float, intx
 from gnuradio import eng_notation
 from gnuradio import soapy
 import fifo_queue_block as queue  # embedded python block
+import trigger_tagger_block as tagger  # embedded python block
+import doppler_velocity_block as doppler  # embedded python block
+import software_trigger_block as trigger  # embedded python block
 from config import CONFIG
+from capture import read_capture_header
+from process_data import velocity_to_doppler
 
 
 
@@ -24,67 +29,136 @@ class RADAR(gr.top_block):
         ##################################################
         # Variables
         ##################################################
-        self.samp_rate = samp_rate = CONFIG.samp_rate
-        self.decimation1 = decimation1 = 1
-        self.freq_cutoff = freq_cutoff = (samp_rate/decimation1)/4.5
+        # replaying a capture stands in for the SDR; its header gives the rate it was taken at,
+        # which is kept here rather than in CONFIG so it never leaks into a live session
+        self.replay_file = CONFIG.replay_file
+        replay_offset = 0
+        self.replay_decimation = 1
+        samp_rate = CONFIG.samp_rate
+        if self.replay_file:
+            with open(self.replay_file, "rb") as f:
+                metadata, replay_offset = read_capture_header(f)
+            if metadata is not None:
+                self.replay_decimation = int(metadata.get("decimation", 1))
+                samp_rate = int(metadata["samp_rate"] / self.replay_decimation)
+
+        self.samp_rate = samp_rate
+        # decimation applied before the capture buffer, fixed once the flowgraph is built
+        self.decimation1 = decimation1 = self.flowgraph_decimation()
+        self.freq_cutoff = freq_cutoff = 0.375*(samp_rate/decimation1)
         self.rf_freq = rf_freq = CONFIG.rf_freq
-        self.record_time = record_time = CONFIG.symetric_record_time
+        self.pre_trigger_time = pre_trigger_time = CONFIG.pre_trigger_time
+        self.post_trigger_time = post_trigger_time = CONFIG.post_trigger_time
         self.gain = gain = CONFIG.sdr_gain
         self.freq_offset = freq_offset = freq_cutoff/2
         self.freq = freq = CONFIG.transmit_freq
+        # fixed once the flowgraph is built, like decimation1
+        self.live_decimation = live_decimation = self.wanted_live_decimation()
 
         ##################################################
         # Blocks
         ##################################################
         self.soapy_limesdr_source_0 = None
-        dev = 'driver=lime'
-        stream_args = ''
-        tune_args = ['']
-        settings = ['']
-
-        self.soapy_limesdr_source_0 = soapy.source(dev, "fc32", 1, '',
-                                  stream_args, tune_args, settings)
-        self.soapy_limesdr_source_0.set_sample_rate(0, samp_rate)
-        self.soapy_limesdr_source_0.set_bandwidth(0, 0.0)
-        self.soapy_limesdr_source_0.set_frequency(0, rf_freq)
-        self.soapy_limesdr_source_0.set_frequency_correction(0, 0)
-        self.soapy_limesdr_source_0.set_gain(0, min(max(gain, -12.0), 61.0))
         self.soapy_limesdr_sink_0 = None
-        dev = 'driver=lime'
-        stream_args = ''
-        tune_args = ['']
-        settings = ['']
-
-        self.soapy_limesdr_sink_0 = soapy.sink(dev, "fc32", 1, '',
-                                  stream_args, tune_args, settings)
-        self.soapy_limesdr_sink_0.set_sample_rate(0, samp_rate)
-        self.soapy_limesdr_sink_0.set_bandwidth(0, 0.0)
-        self.soapy_limesdr_sink_0.set_frequency(0, rf_freq)
-        self.soapy_limesdr_sink_0.set_frequency_correction(0, 0)
-        self.soapy_limesdr_sink_0.set_gain(0, min(max(gain, -12.0), 64.0))
+        self.replay_throttle = None
+        if self.replay_file:
+            # The capture already holds the mixer output. Conjugating it and mixing with a
+            # 0 Hz LO (see freq below) gives it back unchanged, so everything downstream
+            # of the mixer sees exactly what was recorded.
+            self.replay_source = blocks.file_source(gr.sizeof_gr_complex, self.replay_file, CONFIG.replay_loop,
+                                                    replay_offset // gr.sizeof_gr_complex, 0)
+            self.replay_conjugate = blocks.conjugate_cc()
+            if CONFIG.replay_throttle:
+                self.replay_throttle = blocks.throttle(gr.sizeof_gr_complex, samp_rate, True)
+            self.tx_null_sink = blocks.null_sink(gr.sizeof_gr_complex)
+        else:
+            dev = 'driver=lime'
+            stream_args = ''
+            tune_args = ['']
+            settings = ['']
+
+            self.soapy_limesdr_source_0 = soapy.source(dev, "fc32", 1, '',
+                                      stream_args, tune_args, settings)
+            self.soapy_limesdr_source_0.set_sample_rate(0, samp_rate)
+            self.soapy_limesdr_source_0.set_bandwidth(0, 0.0)
+            self.soapy_limesdr_source_0.set_frequency(0, rf_freq)
+            self.soapy_limesdr_source_0.set_frequency_correction(0, 0)
+            self.soapy_limesdr_source_0.set_gain(0, min(max(gain, -12.0), 61.0))
+            dev = 'driver=lime'
+            stream_args = ''
+            tune_args = ['']
+            settings = ['']
+
+            self.soapy_limesdr_sink_0 = soapy.sink(dev, "fc32", 1, '',
+                                      stream_args, tune_args, settings)
+            self.soapy_limesdr_sink_0.set_sample_rate(0, samp_rate)
+            self.soapy_limesdr_sink_0.set_bandwidth(0, 0.0)
+            self.soapy_limesdr_sink_0.set_frequency(0, rf_freq)
+            self.soapy_limesdr_sink_0.set_frequency_correction(0, 0)
+            self.soapy_limesdr_sink_0.set_gain(0, min(max(gain, -12.0), 64.0))
+        # capture chain: anti-alias and decimate, then block the carrier leakage at DC at the
+        # low rate, so the buffer holds what process_data would otherwise reduce it to
         self.low_pass_filter_0 = filter.fir_filter_ccf(
             decimation1,
+            self.decimation_taps())
+        self.dc_length = self.dc_block_length()
+        self.dc_blocker = filter.dc_blocker_cc(self.dc_length, True)
+        self.tagger_block = tagger.trigger_tagger()
+        self.queue_block = queue.fifo_queue(
+            capacity=int(samp_rate/decimation1*(pre_trigger_time + post_trigger_time)),
+            post_trigger=int(samp_rate/decimation1*post_trigger_time))
+        # live velocity branch: decimate in C++, then FFT the low-rate stream in python
+        self.live_filter = filter.fir_filter_ccf(
+            live_decimation,
             firdes.low_pass(
-                40,
+                1,
                 samp_rate,
-                freq_cutoff,
-                1000,
+                0.4*samp_rate/live_decimation,
+                0.1*samp_rate/live_decimation,
                 window.WIN_HAMMING,
                 6.76))
-        self.queue_block = queue.fifo_queue(capacity=(int)(samp_rate*record_time*2))
+        self.doppler_block = doppler.doppler_velocity(
+            samp_rate=samp_rate/live_decimation,
+            fft_size=CONFIG.fft_size,
+            fft_overlap=CONFIG.fft_overlap,
+            carrier_freq=CONFIG.carrier_freq,
+            min_freq=CONFIG.high_pass_cutoff,
+            threshold_db=CONFIG.live_threshold_db)
+        # watches the same band-limited stream for a shot; the callback is set by RADAR_TOP
+        self.trigger_block = trigger.software_trigger(
+            samp_rate=samp_rate/live_decimation,
+            cutoff_freq=CONFIG.high_pass_cutoff,
+            threshold_db=CONFIG.software_trigger_threshold_db,
+            holdoff=CONFIG.software_trigger_holdoff)
         self.blocks_multiply_conjugate_cc_0 = blocks.multiply_conjugate_cc(1)
-        self.analog_sig_source_x_0 = analog.sig_source_c(samp_rate, analog.GR_COS_WAVE, freq, 1, 0, 0)
+        self.analog_sig_source_x_0 = analog.sig_source_c(samp_rate, analog.GR_COS_WAVE, 0 if self.replay_file else freq, 1, 0, 0)
 
 
         ##################################################
         # Connections
         ##################################################
         self.connect((self.analog_sig_source_x_0, 0), (self.blocks_multiply_conjugate_cc_0, 0))
-        self.connect((self.analog_sig_source_x_0, 0), (self.soapy_limesdr_sink_0, 0))
-        # self.connect((self.blocks_multiply_conjugate_cc_0, 0), (self.low_pass_filter_0, 0))
-        # self.connect((self.low_pass_filter_0, 0), (self.queue_block, 0))
-        self.connect((self.blocks_multiply_conjugate_cc_0, 0), (self.queue_block, 0))
-        self.connect((self.soapy_limesdr_source_0, 0), (self.blocks_multiply_conjugate_cc_0, 1))
+        if self.replay_file:
+            self.connect((self.analog_sig_source_x_0, 0), (self.tx_null_sink, 0))
+            if self.replay_throttle is not None:
+                self.connect((self.replay_source, 0), (self.replay_throttle, 0))
+                self.connect((self.replay_throttle, 0), (self.replay_conjugate, 0))
+            else:
+                self.connect((self.replay_source, 0), (self.replay_conjugate, 0))
+            self.connect((self.replay_conjugate, 0), (self.blocks_multiply_conjugate_cc_0, 1))
+        else:
+            self.connect((self.analog_sig_source_x_0, 0), (self.soapy_limesdr_sink_0, 0))
+            self.connect((self.soapy_limesdr_source_0, 0), (self.blocks_multiply_conjugate_cc_0, 1))
+        if decimation1 > 1:
+            self.connect((self.blocks_multiply_conjugate_cc_0, 0), (self.low_pass_filter_0, 0))
+            self.connect((self.low_pass_filter_0, 0), (self.dc_blocker, 0))
+            self.connect((self.dc_blocker, 0), (self.tagger_block, 0))
+        else:
+            self.connect((self.blocks_multiply_conjugate_cc_0, 0), (self.tagger_block, 0))
+        self.connect((self.tagger_block, 0), (self.queue_block, 0))
+        self.connect((self.blocks_multiply_conjugate_cc_0, 0), (self.live_filter, 0))
+        self.connect((self.live_filter, 0), (self.doppler_block, 0))
+        self.connect((self.live_filter, 0), (self.trigger_block, 0))
 
 
     def get_samp_rate(self):
@@ -92,20 +166,56 @@ class RADAR(gr.top_block):
 
     def set_samp_rate(self, samp_rate):
         self.samp_rate = samp_rate
-        self.set_freq_cutoff((self.samp_rate/self.decimation1)/2.5)
+        self.set_freq_cutoff(0.375*(self.samp_rate/self.decimation1))
         self.analog_sig_source_x_0.set_sampling_freq(self.samp_rate)
-        self.queue_block.capacity = self.samp_rate/self.decimation1
-        self.low_pass_filter_0.set_taps(firdes.low_pass(40, self.samp_rate, self.freq_cutoff, 1000, window.WIN_HAMMING, 6.76))
-        self.soapy_limesdr_sink_0.set_sample_rate(0, self.samp_rate)
-        self.soapy_limesdr_source_0.set_sample_rate(0, self.samp_rate)
+        self.update_queue_length()
+        if self.replay_file:
+            if self.replay_throttle is not None:
+                self.replay_throttle.set_sample_rate(self.samp_rate)
+        else:
+            self.soapy_limesdr_sink_0.set_sample_rate(0, self.samp_rate)
+            self.soapy_limesdr_source_0.set_sample_rate(0, self.samp_rate)
+        self.live_filter.set_taps(firdes.low_pass(1, self.samp_rate, 0.4*self.samp_rate/self.live_decimation, 0.1*self.samp_rate/self.live_decimation, window.WIN_HAMMING, 6.76))
+        self.doppler_block.set_samp_rate(self.samp_rate/self.live_decimation)
+        self.trigger_block.set_samp_rate(self.samp_rate/self.live_decimation)
 
     def get_decimation1(self):
         return self.decimation1
 
     def set_decimation1(self, decimation1):
         self.decimation1 = decimation1
-        self.set_freq_cutoff((self.samp_rate/self.decimation1)/2.5)
-        self.queue_block.capacity = self.samp_rate/self.decimation1
+        self.set_freq_cutoff(0.375*(self.samp_rate/self.decimation1))
+        self.update_queue_length()
+
+    def flowgraph_decimation(self):
+        """Decimation CONFIG asks for before the capture buffer, less any the replayed capture already has."""
+        if not CONFIG.flowgraph_decimation:
+            return 1
+        return max(1, CONFIG.decimation // self.replay_decimation)
+
+    def decimation_taps(self):
+        """Anti-aliasing low-pass for the capture chain, passband to a quarter of the decimated rate."""
+        return firdes.low_pass(1, self.samp_rate, self.freq_cutoff, 0.25*(self.samp_rate/self.decimation1), window.WIN_HAMMING, 6.76)
+
+    def dc_block_length(self):
+        """DC blocker length whose first passband point sits at CONFIG.high_pass_cutoff at the decimated rate."""
+        return max(2, int(round((self.samp_rate/self.decimation1)/CONFIG.high_pass_cutoff)))
+
+    def wanted_live_decimation(self):
+        """
+        Live-branch decimation: CONFIG.live_decimation if set, otherwise the largest factor
+        that keeps the Doppler of CONFIG.max_velocity inside the live filter's passband
+        (0.4 of the decimated rate), so the Python blocks see as few samples as possible.
+        """
+        if CONFIG.live_decimation:
+            return int(CONFIG.live_decimation)
+        max_doppler = velocity_to_doppler(CONFIG.max_velocity, CONFIG.carrier_freq)
+        return max(1, int(0.4*self.samp_rate // max_doppler))
+
+    def matches_config(self):
+        """False when CONFIG changed something only rebuilding the flowgraph can apply."""
+        return (self.decimation1 == self.flowgraph_decimation() and self.dc_length == self.dc_block_length()
+                and self.live_decimation == self.wanted_live_decimation())
 
     def get_freq_cutoff(self):
         return self.freq_cutoff
@@ -113,29 +223,53 @@ class RADAR(gr.top_block):
     def set_freq_cutoff(self, freq_cutoff):
         self.freq_cutoff = freq_cutoff
         self.set_freq_offset(self.freq_cutoff/2)
-        self.low_pass_filter_0.set_taps(firdes.low_pass(40, self.samp_rate, self.freq_cutoff, 1000, window.WIN_HAMMING, 6.76))
+        self.low_pass_filter_0.set_taps(self.decimation_taps())
 
     def get_rf_freq(self):
         return self.rf_freq
 
     def set_rf_freq(self, rf_freq):
         self.rf_freq = rf_freq
-        self.soapy_limesdr_sink_0.set_frequency(0, self.rf_freq)
-        self.soapy_limesdr_source_0.set_frequency(0, self.rf_freq)
+        if not self.replay_file:
+            self.soapy_limesdr_sink_0.set_frequency(0, self.rf_freq)
+            self.soapy_limesdr_source_0.set_frequency(0, self.rf_freq)
+
+    def get_pre_trigger_time(self):
+        return self.pre_trigger_time
+
+    def set_pre_trigger_time(self, pre_trigger_time):
+        self.pre_trigger_time = pre_trigger_time
+        self.update_queue_length()
+
+    def get_post_trigger_time(self):
+        return self.post_trigger_time
+
+    def set_post_trigger_time(self, post_trigger_time):
+        self.post_trigger_time = post_trigger_time
+        self.update_queue_length()
 
-    def get_record_time(self):
-        return self.record_time
+    def update_queue_length(self):
+        rate = self.samp_rate/self.decimation1
+        self.queue_block.set_post_trigger(int(rate*self.post_trigger_time))
+        self.queue_block.set_capacity(int(rate*(self.pre_trigger_time + self.post_trigger_time)))
 
-    def set_record_time(self, record_time):
-        self.record_time = record_time
+    def live_to_stream_offset(self, offset):
+        """Maps an offset on the live (decimated) branch to the capture buffer's stream, filter delays accounted for."""
+        delay = (len(self.live_filter.taps()) - 1) // 2
+        offset = max(0, offset*self.live_decimation - delay)
+        if self.decimation1 > 1:
+            delay = (len(self.low_pass_filter_0.taps()) - 1) // 2
+            offset = int(round((offset + delay) / self.decimation1)) + self.dc_blocker.group_delay()
+        return offset
 
     def get_gain(self):
         return self.gain
 
     def set_gain(self, gain):
         self.gain = gain
-        self.soapy_limesdr_sink_0.set_gain(0, min(max(self.gain, -12.0), 64.0))
-        self.soapy_limesdr_source_0.set_gain(0, min(max(self.gain, -12.0), 61.0))
+        if not self.replay_file:
+            self.soapy_limesdr_sink_0.set_gain(0, min(max(self.gain, -12.0), 64.0))
+            self.soapy_limesdr_source_0.set_gain(0, min(max(self.gain, -12.0), 61.0))
 
     def get_freq_offset(self):
         return self.freq_offset
@@ -148,4 +282,5 @@ class RADAR(gr.top_block):
 
     def set_freq(self, freq):
         self.freq = freq
-        self.analog_sig_source_x_0.set_frequency(self.freq)
\ No newline at end of file
+        if not self.replay_file:
+            self.analog_sig_source_x_0.set_frequency(self.freq)
\ No newline at end of file
@@ -1,8 +1,139 @@
+import os
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.signal import butter, filtfilt, decimate, cheby1, sosfilt, spectrogram
+from scipy.signal import butter, filtfilt, cheby1, sosfilt, spectrogram, firwin, kaiserord, upfirdn, get_window, resample_poly, ZoomFFT
+from numpy.lib.stride_tricks import sliding_window_view
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
 from config import CONFIG
+from capture import open_capture
+from fft_backend import fft_backend
 from scipy.constants import c
+import scipy.fft
+
+# Filter designs and windows are cached on their parameters, so repeated runs with the same
+# settings never redesign them. The caches are bounded; least recently used designs go first.
+DESIGN_CACHE_SIZE = 32
+
+# With CONFIG.dsp_precision = "single", the max velocity may differ from the float64 result
+# by at most this fraction of it. Rounding in float32 moves each frame's peak by a tiny
+# fraction of a bin, far below the 5% accuracy spec; the margin covers noisy frames whose
+# peak bin flips. benchmark_dsp.py --check-precision verifies it on synthetic captures.
+SINGLE_PRECISION_TOLERANCE = 0.005
+
+def dsp_real_dtype():
+    """
+    Real dtype the DSP chain runs in: float32 (complex64 data) when CONFIG.dsp_precision is
+    "single", float64 (complex128 data) otherwise. Filter designs and windows are cast to it,
+    so scipy keeps the samples in that precision instead of promoting them.
+    """
+    return np.float32 if CONFIG.dsp_precision == "single" else np.float64
+
+def _read_only(array):
+    # cached designs are shared between callers, keep them from being modified in place
+    array.setflags(write=False)
+    return array
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def butter_coefficients(filter_order, cutoff_freq, sampling_rate, btype):
+    """
+    Designs (or returns the cached) Butterworth filter as (b, a).
+    """
+    # Normalize the cutoff frequency to Nyquist frequency
+    nyquist_freq = 0.5 * sampling_rate
+    normalized_cutoff = cutoff_freq / nyquist_freq
+
+    b, a = butter(filter_order, normalized_cutoff, btype=btype, analog=False)
+    return _read_only(b), _read_only(a)
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def decimate_fir_taps(decimation_factor):
+    """
+    Returns the (cached) anti-aliasing FIR scipy.signal.decimate uses for ftype='fir'.
+    """
+    return _read_only(firwin(20 * decimation_factor + 1, 1. / decimation_factor, window='hamming'))
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def stft_window(nfft):
+    """
+    Returns the (cached) spectrogram window, scipy.signal.spectrogram's default Tukey window.
+    """
+    return _read_only(get_window(('tukey', .25), nfft))
+
+def doppler_band(sampling_rate, nfft, carrier_freq=None):
+    """
+    The Doppler band a projectile between CONFIG.min_velocity and CONFIG.max_velocity can
+    occupy, capped at the Nyquist frequency, and how many bins cover it at
+    CONFIG.zoom_resolution.
+
+    Returns:
+        (float, float, int): Lower and upper band edge (in Hz) and the number of bins.
+    """
+    min_freq = velocity_to_doppler(CONFIG.min_velocity, carrier_freq)
+    max_freq = min(velocity_to_doppler(CONFIG.max_velocity, carrier_freq), sampling_rate / 2)
+    if min_freq >= max_freq:
+        raise ValueError(f"{CONFIG.min_velocity} m/s is above the Nyquist frequency of the {sampling_rate:g} Hz "
+                         f"decimated signal, lower CONFIG.decimation")
+    spacing = velocity_to_doppler(CONFIG.zoom_resolution, carrier_freq)
+    return min_freq, max_freq, max(1, int(np.ceil((max_freq - min_freq) / spacing)))
+
+def doppler_band_rows(freqs, sampling_rate, nfft, carrier_freq=None):
+    """
+    Indices of the spectrum bins (freqs in Hz) inside the Doppler band, both directions,
+    so the "fft" engine's peak search skips carrier leakage and spurs no projectile makes.
+    """
+    min_freq, max_freq, _ = doppler_band(sampling_rate, nfft, carrier_freq)
+    return np.flatnonzero((np.abs(freqs) >= min_freq) & (np.abs(freqs) <= max_freq))
+
+class BandFFT:
+    """
+    Evaluates the Doppler band of each frame with one FFT, zero-padded to size, keeping only
+    the bins inside the band. Called like a ZoomFFT, for when it is the cheaper of the two.
+    """
+    def __init__(self, size, sampling_rate, min_freq, max_freq):
+        self.size = size
+        spacing = sampling_rate / size
+        first = int(np.ceil(min_freq / spacing))
+        k = np.arange(first, max(first, int(np.floor(max_freq / spacing))) + 1)
+        # the receding half mirrors the approaching one, so both have the same number of bins
+        self.bins = np.concatenate((-k[::-1], k))
+        self.rows = self.bins % size
+
+    def __call__(self, x, axis=-1):
+        return np.take(scipy.fft.fft(x, self.size, axis=axis), self.rows, axis=axis)
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def zoom_transforms(nfft, sampling_rate, min_freq, max_freq, bins):
+    """
+    Returns the (cached) transforms that evaluate the approaching and receding halves of
+    the Doppler band at bins per half, and the frequency of every bin they produce, in
+    ascending order.
+
+    A chirp-z transform costs two FFTs a little longer than nfft + bins for each half, so it
+    only pays off when the band is a small part of a spectrum that would otherwise need
+    heavy zero-padding. Otherwise one FFT, zero-padded to at least the same resolution, is
+    cheaper and its band bins are used instead.
+    """
+    spacing = (max_freq - min_freq) / bins
+    # padded by a power of two, so every bin of the unpadded FFT stays a bin
+    fft_size = nfft * 2 ** max(0, int(np.ceil(np.log2(sampling_rate / (spacing * nfft)))))
+    czt_size = scipy.fft.next_fast_len(nfft + bins - 1)
+    if 4 * czt_size * np.log2(czt_size) >= fft_size * np.log2(fft_size):
+        transform = BandFFT(fft_size, sampling_rate, min_freq, max_freq)
+        return (transform,), _read_only(transform.bins * (sampling_rate / fft_size))
+
+    transforms = (ZoomFFT(nfft, [-max_freq, -min_freq], bins, fs=sampling_rate, endpoint=False),
+                  ZoomFFT(nfft, [min_freq, max_freq], bins, fs=sampling_rate, endpoint=False))
+    # each half starts at its own lower edge, as ZoomFFT evaluates [f1, f2) with endpoint=False
+    steps = (max_freq - min_freq) * np.arange(bins) / bins
+    freqs = np.concatenate((-max_freq + steps, min_freq + steps))
+    return transforms, _read_only(freqs)
+
+def zoom_spectrum(frames, transforms):
+    """Evaluates windowed frames (frames x nfft) on the Doppler band only."""
+    return np.concatenate([transform(frames, axis=-1) for transform in transforms], axis=-1)
 
 def lowpass_filter_decimate(data, cutoff_freq, original_sampling_rate, decimation_factor, filter_order=8):
     """
@@ -18,23 +149,231 @@ def lowpass_filter_decimate(data, cutoff_freq, original_sampling_rate, decimatio
     Returns:
         numpy.ndarray: The filtered and decimated data.
     """
-    # Normalize the cutoff frequency to Nyquist frequency
-    nyquist_freq = 0.5 * original_sampling_rate
-    normalized_cutoff = cutoff_freq / nyquist_freq
-
     # Design the Butterworth filter
-    b, a = butter(filter_order, normalized_cutoff, btype='low', analog=False)
+    b, a = butter_coefficients(filter_order, cutoff_freq, original_sampling_rate, 'low')
 
     # Apply the filter using filtfilt for zero-phase filtering
     filtered_data = filtfilt(b, a, data)
 
-    # Decimate the filtered data
-    decimated_data = decimate(filtered_data, decimation_factor, ftype='fir')
+    # Decimate the filtered data, same as decimate(filtered_data, decimation_factor, ftype='fir')
+    decimated_data = resample_poly(filtered_data, 1, decimation_factor, window=decimate_fir_taps(decimation_factor))
     
     #decimated_data = decimate(data, decimation_factor, ftype='fir')
 
     return decimated_data
 
+def decimation_stages(decimation_factor, max_stage_factor=10):
+    """
+    Splits a decimation factor into the per-stage factors of a multistage decimator.
+
+    Prime factors are packed, largest first, into stages no bigger than max_stage_factor,
+    so 80 becomes [10, 8]. A prime larger than max_stage_factor gets a stage of its own.
+
+    Args:
+        decimation_factor (int): The total decimation factor.
+        max_stage_factor (int, optional): Largest factor to combine into one stage. Defaults to 10.
+
+    Returns:
+        list of int: Stage factors, in the order they are applied.
+    """
+    decimation_factor = int(decimation_factor)
+    if decimation_factor <= 1:
+        return [1]
+
+    primes = []
+    remaining = decimation_factor
+    p = 2
+    while p * p <= remaining:
+        while remaining % p == 0:
+            primes.append(p)
+            remaining //= p
+        p += 1
+    if remaining > 1:
+        primes.append(remaining)
+
+    stages = []
+    for p in sorted(primes, reverse=True):
+        for i, stage in enumerate(stages):
+            if stage * p <= max_stage_factor:
+                stages[i] = stage * p
+                break
+        else:
+            stages.append(p)
+
+    return sorted(stages, reverse=True)
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def design_decimation_stage(factor, input_rate, passband_edge, stopband_edge, atten_db=60):
+    """
+    Designs the anti-aliasing FIR for one decimation stage.
+
+    The tap count is rounded up to 2*k*factor + 1 so the filter's group delay is a whole
+    number (k) of output samples and can be removed exactly.
+
+    Args:
+        factor (int): The stage's decimation factor.
+        input_rate (float): The stage's input sampling rate (in Hz).
+        passband_edge (float): Highest frequency that must pass (in Hz).
+        stopband_edge (float): Lowest frequency that must be rejected (in Hz).
+        atten_db (float, optional): Stopband attenuation in dB. Defaults to 60.
+
+    Returns:
+        numpy.ndarray: The filter taps.
+    """
+    nyquist_freq = 0.5 * input_rate
+    width = (stopband_edge - passband_edge) / nyquist_freq
+    numtaps, beta = kaiserord(atten_db, width)
+
+    k = max(1, int(np.ceil((numtaps - 1) / (2 * factor))))
+    numtaps = 2 * k * factor + 1
+
+    cutoff = 0.5 * (passband_edge + stopband_edge)
+    return _read_only(firwin(numtaps, cutoff, window=('kaiser', beta), fs=input_rate))
+
+class PolyphaseDecimator:
+    """
+    One FIR decimation stage, computed polyphase (only the kept outputs are evaluated).
+
+    The stage is stateful: process() can be fed the signal in pieces and flush() returns the
+    last outputs, giving the same result as filtering the whole signal at once. The filter's
+    delay is removed, so the output lines up with the input like scipy's zero-phase decimate.
+    """
+    def __init__(self, taps, factor):
+        self.taps = np.asarray(taps)
+        self.factor = int(factor)
+        self.delay = (len(self.taps) - 1) // (2 * self.factor)  # group delay in output samples
+        self.history = np.zeros(len(self.taps) - 1, dtype=self.taps.dtype)
+        self.samples_in = 0
+        self.samples_out = 0
+        self.skip = self.delay
+
+    def process(self, data):
+        """
+        Filters and decimates the next piece of the signal.
+
+        Args:
+            data (array-like): The next input samples.
+
+        Returns:
+            numpy.ndarray: The decimated samples that are ready.
+        """
+        data = np.asarray(data)
+        n = len(data)
+        q = self.factor
+
+        # the first input in this piece that lands on an output sample
+        first = (-self.samples_in) % q
+        count = -(-(n - first) // q) if n > first else 0
+
+        joined = np.concatenate((self.history, data))
+        # full convolution index (len(taps) - 1) + j*q is the output at input first + j*q
+        out = upfirdn(self.taps, joined[first:], 1, q)[2 * self.delay:2 * self.delay + count]
+
+        self.history = joined[len(joined) - (len(self.taps) - 1):]
+        self.samples_in += n
+
+        # drop the filter's delay from the start of the stream
+        if self.skip:
+            dropped = min(self.skip, len(out))
+            out = out[dropped:]
+            self.skip -= dropped
+
+        self.samples_out += len(out)
+        return out
+
+    def flush(self):
+        """
+        Returns the outputs still held back by the filter's delay.
+
+        Returns:
+            numpy.ndarray: The final decimated samples.
+        """
+        total = -(-self.samples_in // self.factor)
+        samples_in = self.samples_in
+        out = self.process(np.zeros((self.delay + 1) * self.factor, dtype=self.history.dtype))
+        self.samples_in = samples_in
+        out = out[:max(0, total - (self.samples_out - len(out)))]
+        self.samples_out = total
+        return out
+
+class MultistageDecimator:
+    """
+    Chain of polyphase FIR stages that low-pass filters and decimates a signal.
+
+    Each stage only protects the final passband, so the early stages, which run at the
+    highest rates, get wide transition bands and short filters.
+    """
+    def __init__(self, decimation_factor, sampling_rate, cutoff_freq, max_stage_factor=10, atten_db=60):
+        self.decimation_factor = int(decimation_factor)
+        self.factors = decimation_stages(self.decimation_factor, max_stage_factor)
+
+        output_rate = sampling_rate / self.decimation_factor
+        # keep the passband clear of the final Nyquist frequency
+        passband_edge = min(cutoff_freq, 0.4 * output_rate)
+
+        self.stages = []
+        rate = sampling_rate
+        for i, factor in enumerate(self.factors):
+            stage_rate = rate / factor
+            if i == len(self.factors) - 1:
+                # last stage: nothing above the output Nyquist frequency may alias back
+                stopband_edge = 0.5 * stage_rate
+            else:
+                # only what would alias into the final passband has to go
+                stopband_edge = stage_rate - passband_edge
+            taps = design_decimation_stage(factor, rate, passband_edge, stopband_edge, atten_db).astype(dsp_real_dtype(), copy=False)
+            self.stages.append(PolyphaseDecimator(taps, factor))
+            rate = stage_rate
+
+    def process(self, data):
+        for stage in self.stages:
+            data = stage.process(data)
+        return data
+
+    def flush(self):
+        data = None
+        for stage in self.stages:
+            if data is not None:
+                data = np.concatenate((stage.process(data), stage.flush()))
+            else:
+                data = stage.flush()
+        return data
+
+def decimate_multistage(data, decimation_factor, sampling_rate, cutoff_freq):
+    """
+    Low-pass filters and decimates the data with a multistage polyphase FIR decimator.
+
+    This replaces a full-rate filtfilt followed by decimate(): every stage filters at the
+    lowest rate it can, so the work shrinks with the decimation factor.
+
+    Args:
+        data (array-like): The input data.
+        decimation_factor (int): The total decimation factor.
+        sampling_rate (float): The sampling rate of the data (in Hz).
+        cutoff_freq (float): Highest frequency to keep (in Hz).
+
+    Returns:
+        numpy.ndarray: The filtered and decimated data, ceil(len(data) / decimation_factor) samples.
+    """
+    decimator = MultistageDecimator(decimation_factor, sampling_rate, cutoff_freq)
+    return np.concatenate((decimator.process(data), decimator.flush()))
+
+def highpass_after_decimation(cutoff_freq, decimated_rate):
+    """
+    Checks whether the high-pass can run after decimation instead of at the full rate.
+
+    Both filters are linear and time-invariant, so their order can be swapped as long as the
+    cutoff still sits comfortably below the decimated Nyquist frequency.
+
+    Args:
+        cutoff_freq (float): The high-pass cutoff frequency (in Hz).
+        decimated_rate (float): The sampling rate after decimation (in Hz).
+
+    Returns:
+        bool: True if the high-pass can be moved after decimation.
+    """
+    return cutoff_freq < 0.4 * decimated_rate
+
 def highpass_filter(data, cutoff_freq, sampling_rate, filter_order=8):
     """
     Applies a high-pass filter to the data.
@@ -48,12 +387,8 @@ def highpass_filter(data, cutoff_freq, sampling_rate, filter_order=8):
     Returns:
         numpy.ndarray: The filtered data.
     """
-    # Normalize the cutoff frequency to Nyquist frequency
-    nyquist_freq = 0.5 * sampling_rate
-    normalized_cutoff = cutoff_freq / nyquist_freq
-
     # Design the Butterworth filter
-    b, a = butter(filter_order, normalized_cutoff, btype='high', analog=False)
+    b, a = butter_coefficients(filter_order, cutoff_freq, sampling_rate, 'high')
 
     # Apply the filter using filtfilt for zero-phase filtering
     filtered_data = filtfilt(b, a, data)
@@ -74,19 +409,297 @@ def highpass_chebyshev(data, cutoff_freq, sampling_rate, filter_order=6, ripple_
     Returns:
         numpy.ndarray: Filtered signal.
     """
+    sos = chebyshev_highpass_sos(cutoff_freq, sampling_rate, filter_order, ripple_db).astype(dsp_real_dtype(), copy=False)
+
+    # Apply the filter with zero-phase distortion
+    filtered_data = sosfilt(sos, data)
+
+    return filtered_data
+
+def chebyshev_highpass_sos(cutoff_freq, sampling_rate, filter_order=6, ripple_db=0.5):
+    """
+    Designs (or returns the cached) Chebyshev Type I high-pass filter used by highpass_chebyshev.
+
+    Returns:
+        numpy.ndarray: The filter as second-order sections.
+    """
+    # one cache entry per design, however the arguments were passed
+    return _chebyshev_highpass_sos(filter_order, ripple_db, cutoff_freq, sampling_rate)
+
+@lru_cache(maxsize=DESIGN_CACHE_SIZE)
+def _chebyshev_highpass_sos(filter_order, ripple_db, cutoff_freq, sampling_rate):
     nyquist_freq = 0.5 * sampling_rate
     normalized_cutoff = cutoff_freq / nyquist_freq
 
     # Design the Chebyshev Type I high-pass filter
-    sos = cheby1(filter_order, ripple_db, normalized_cutoff, btype='high', analog=False, output='sos')
+    return _read_only(cheby1(filter_order, ripple_db, normalized_cutoff, btype='high', analog=False, output='sos'))
 
-    # Apply the filter with zero-phase distortion
-    filtered_data = sosfilt(sos, data)
 
-    return filtered_data
+def decimator_reach(decimator):
+    """
+    How far (in input samples) a MultistageDecimator output depends on the input around it.
+
+    Each stage's filter is centred on its output and spans (taps - 1) / 2 of its input
+    samples either side, which are worth the product of the earlier factors in samples of
+    the original input. One output period is added for margin.
+    """
+    reach = 0
+    scale = 1
+    for stage in decimator.stages:
+        reach += (len(stage.taps) - 1) // 2 * scale
+        scale *= stage.factor
+    return reach + scale
+
+def iir_settle_samples(sos, dtype):
+    """
+    Samples after which the start-up transient of a filter has decayed below the
+    resolution of dtype, from the filter's slowest pole.
+    """
+    radius = max(np.max(np.abs(np.roots(section[3:]))) for section in sos)
+    if radius == 0:
+        return 0
+    return int(np.ceil(np.log(np.finfo(dtype).eps) / np.log(radius)))
+
+_parallel_pool = None
+_parallel_pool_workers = None
+
+def parallel_workers():
+    """Worker processes for parallel filtering from CONFIG.parallel_workers; -1 means one per CPU."""
+    workers = CONFIG.parallel_workers
+    if workers is None or workers < 1:
+        return os.cpu_count() or 1
+    return workers
+
+def parallel_pool():
+    """
+    Returns the process pool used by filter_decimate_parallel, starting its workers on first use.
+
+    The pool is kept between captures so the workers' start-up is not paid again on every
+    shot; it is restarted if CONFIG.parallel_workers changes. The workers are forked from
+    the calling process, so no entry point needs a main guard, but the first call should
+    come before the process starts threads, a flowgraph or Tk; gui.main starts the pool
+    before anything else.
+    """
+    global _parallel_pool, _parallel_pool_workers
+    workers = parallel_workers()
+    if _parallel_pool is None or _parallel_pool_workers != workers:
+        if _parallel_pool is not None:
+            _parallel_pool.shutdown(wait=False)
+        # workers must share this process's resource tracker; one of their own would
+        # unlink the shared memory they attach to when they exit
+        resource_tracker.ensure_running()
+        _parallel_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork"))
+        _parallel_pool_workers = workers
+        # a fork pool starts all of its workers on the first submit, not before
+        _parallel_pool.submit(int).result()
+    return _parallel_pool
+
+def _filter_segment(task):
+    # Runs in a worker: filters input[lo:hi] of the shared input and writes the decimated
+    # outputs of [start, stop) into the shared output at out_start.
+    (input_name, input_len, input_dtype, output_name, output_len, output_dtype,
+     lo, start, stop, hi, decimation, input_rate, cutoff_freq, highpass_cutoff, precision) = task
+    CONFIG.dsp_precision = precision
+
+    input_shm = shared_memory.SharedMemory(name=input_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        data = np.ndarray((input_len,), dtype=input_dtype, buffer=input_shm.buf)
+        out = np.ndarray((output_len,), dtype=output_dtype, buffer=output_shm.buf)
 
+        segment = data[lo:hi]
+        if highpass_cutoff is not None:
+            segment = highpass_chebyshev(segment, highpass_cutoff, input_rate)
+        decimated = decimate_multistage(segment, decimation, input_rate, cutoff_freq)
 
-def compute_spectrogram_and_max_freq(signal, sampling_rate, nfft=1024, noverlap=512):
+        skip = (start - lo) // decimation
+        count = -(-(stop - start) // decimation)
+        out_start = start // decimation
+        out[out_start:out_start + count] = decimated[skip:skip + count]
+        del data, out
+    finally:
+        input_shm.close()
+        output_shm.close()
+    return count
+
+def filter_decimate_parallel(data, decimation_factor, sampling_rate, cutoff_freq, highpass_cutoff=None, workers=None):
+    """
+    High-passes (optionally) and decimates the data across the worker pool.
+
+    The data is copied once into shared memory and split into one segment per worker, with
+    boundaries on multiples of the decimation factor. Every segment is filtered together
+    with the samples before it that the filters need to settle (the decimator's reach, plus
+    the high-pass transient when there is one) and the decimator's reach after it; the
+    outputs of those extra samples are dropped, and each worker writes its own part of the
+    shared output. The FIR outputs are the same as decimate_multistage over the whole data;
+    the high-pass differs from one pass over the whole data by no more than its own
+    rounding error.
+
+    Args:
+        data (array-like): The input data.
+        decimation_factor (int): The total decimation factor.
+        sampling_rate (float): The sampling rate of the data (in Hz).
+        cutoff_freq (float): Highest frequency to keep (in Hz).
+        highpass_cutoff (float, optional): Chebyshev high-pass cutoff applied before
+            decimation (in Hz). None skips the high-pass.
+        workers (int, optional): Segments to split the data into. Defaults to parallel_workers().
+
+    Returns:
+        numpy.ndarray: The filtered and decimated data, ceil(len(data) / decimation_factor) samples.
+    """
+    data = np.asarray(data)
+    n = len(data)
+    q = int(decimation_factor)
+    if workers is None:
+        workers = parallel_workers()
+
+    decimator = MultistageDecimator(q, sampling_rate, cutoff_freq)
+    post = decimator_reach(decimator)
+    pre = post
+    if highpass_cutoff is not None:
+        pre += iir_settle_samples(chebyshev_highpass_sos(highpass_cutoff, sampling_rate), dsp_real_dtype())
+    pre = -(-pre // q) * q
+
+    # segments too short to be worth their overlap go back to the single-process path
+    segment = -(-n // workers)
+    segment = -(-max(segment, CONFIG.parallel_min_samples) // q) * q
+    if segment >= n:
+        if highpass_cutoff is not None:
+            data = highpass_chebyshev(data, highpass_cutoff, sampling_rate)
+        return decimate_multistage(data, q, sampling_rate, cutoff_freq)
+
+    output_dtype = np.result_type(data.dtype, dsp_real_dtype(), np.complex64)
+    output_len = -(-n // q)
+    input_shm = shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+    output_shm = shared_memory.SharedMemory(create=True, size=max(output_len * np.dtype(output_dtype).itemsize, 1))
+    try:
+        np.ndarray(data.shape, dtype=data.dtype, buffer=input_shm.buf)[:] = data
+
+        tasks = []
+        for start in range(0, n, segment):
+            stop = min(start + segment, n)
+            tasks.append((input_shm.name, n, data.dtype.str, output_shm.name, output_len, np.dtype(output_dtype).str,
+                          max(start - pre, 0), start, stop, min(stop + post, n), q, sampling_rate, cutoff_freq,
+                          highpass_cutoff, CONFIG.dsp_precision))
+        list(parallel_pool().map(_filter_segment, tasks))
+
+        return np.ndarray((output_len,), dtype=output_dtype, buffer=output_shm.buf).copy()
+    finally:
+        input_shm.close()
+        input_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+
+
+def find_event_windows(signal, sampling_rate, nfft=1024, noverlap=512, threshold_db=10, margin_time=0.01):
+    """
+    Finds the parts of the signal that hold an event, using short-time energy.
+
+    The (already band-limited) signal is cut into hops of nfft - noverlap samples and each
+    hop's mean power is compared to the median, which stands in for the noise floor. Hops
+    more than threshold_db above it are padded by margin_time and merged. Window edges are
+    snapped to the spectrogram's frame grid, so the frames inside a window are the same
+    frames a full spectrogram would compute.
+
+    Args:
+        signal (array-like): The decimated, filtered signal.
+        sampling_rate (float): The sampling rate in Hz.
+        nfft (int, optional): Number of FFT points. Defaults to 1024.
+        noverlap (int, optional): Number of overlapping samples. Defaults to 512.
+        threshold_db (float, optional): Energy above the noise floor that marks an event. Defaults to 10 dB.
+        margin_time (float, optional): Time kept on either side of an event (in s). Defaults to 0.01.
+
+    Returns:
+        list of (int, int): Sample ranges [start, stop) to analyze. The whole signal when no
+        event stands out or the events cover most of it.
+    """
+    n = len(signal)
+    step = nfft - noverlap
+    whole = [(0, n)]
+    n_hops = n // step
+    if n < nfft or n_hops < 2:
+        return whole
+
+    energy = np.mean(np.abs(signal[:n_hops * step].reshape(n_hops, step)) ** 2, axis=1)
+    floor = np.median(energy)
+    hits = np.flatnonzero(energy > floor * 10 ** (threshold_db / 10))
+    if len(hits) == 0:
+        return whole
+
+    margin = int(margin_time * sampling_rate)
+    last_start = (n - nfft) // step * step  # start of the last full frame
+    windows = []
+    for hop in hits:
+        # snap out to whole frames that cover the hop plus the margin
+        start = max(0, (hop * step - margin) // step * step)
+        start = min(start, last_start)
+        frames = -(-((hop + 1) * step + margin - start - nfft) // step)
+        stop = min(start + nfft + max(frames, 0) * step, last_start + nfft)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], stop))
+        else:
+            windows.append((start, stop))
+
+    if sum(stop - start for start, stop in windows) > n // 2:
+        return whole
+    return windows
+
+def full_spectrogram(signal, sampling_rate, nfft=1024, noverlap=512, windows=None):
+    """
+    Two-sided spectrogram over every FFT bin, with zero frequency centred.
+
+    Returns:
+        freqs (ndarray): Frequency bins (in Hz).
+        times (ndarray): Time bins.
+        Sxx (ndarray): Spectrogram power, bins x frames.
+    """
+    window = stft_window(nfft).astype(dsp_real_dtype(), copy=False)
+    if windows is None:
+        freqs, times, Sxx = spectrogram(signal, fs=sampling_rate, window=window, nperseg=nfft, noverlap=noverlap, return_onesided=False)
+    else:
+        # frames from each window, with times shifted to where the window sits in the signal
+        parts = [spectrogram(signal[start:stop], fs=sampling_rate, window=window, nperseg=nfft, noverlap=noverlap, return_onesided=False)
+                 for start, stop in windows]
+        freqs = parts[0][0]
+        times = np.concatenate([t + start / sampling_rate for (start, stop), (_, t, _) in zip(windows, parts)])
+        Sxx = np.concatenate([part[2] for part in parts], axis=1)
+
+    # Shift frequencies to center zero frequency
+    return np.fft.fftshift(freqs), times, np.fft.fftshift(Sxx, axes=0)
+
+def zoom_spectrogram(signal, sampling_rate, nfft=1024, noverlap=512, carrier_freq=None, windows=None):
+    """
+    Spectrogram evaluated only on the Doppler band of CONFIG.min_velocity to
+    CONFIG.max_velocity, both directions, with a chirp-z (zoom) transform per frame.
+
+    Frames, window, detrending and scaling match full_spectrogram, so the bins it does
+    compute have the same power. Carrier leakage and spurs outside the band cannot win
+    the peak search.
+
+    Returns:
+        freqs (ndarray): Frequency bins (in Hz), the receding half of the band then the approaching half.
+        times (ndarray): Time bins.
+        Sxx (ndarray): Spectrogram power, bins x frames.
+    """
+    transforms, freqs = zoom_transforms(nfft, sampling_rate, *doppler_band(sampling_rate, nfft, carrier_freq))
+    window = stft_window(nfft).astype(dsp_real_dtype(), copy=False)
+    scale = 1.0 / (sampling_rate * np.sum(window ** 2))
+    step = nfft - noverlap
+
+    times, parts = [], []
+    for start, stop in [(0, len(signal))] if windows is None else windows:
+        if stop - start < nfft:
+            continue
+        frames = sliding_window_view(signal[start:stop], nfft)[::step]
+        frames = frames - frames.mean(axis=1, keepdims=True)
+        parts.append((np.abs(zoom_spectrum(frames * window, transforms)) ** 2 * scale).astype(window.dtype, copy=False))
+        times.append((start + nfft / 2 + np.arange(len(frames)) * step) / sampling_rate)
+
+    if not parts:
+        return freqs, np.zeros(0), np.zeros((len(freqs), 0))
+    return freqs, np.concatenate(times), np.concatenate(parts).T
+
+def compute_spectrogram_and_max_freq(signal, sampling_rate, nfft=1024, noverlap=512, carrier_freq=None, windows=None):
     """
     Computes the spectrogram and extracts the dominant frequency at each time step, 
     setting it to zero if below a power threshold.
@@ -96,7 +709,9 @@ def compute_spectrogram_and_max_freq(signal, sampling_rate, nfft=1024, noverlap=
         sampling_rate (float): The sampling rate in Hz.
         nfft (int, optional): Number of FFT points. Defaults to 1024.
         noverlap (int, optional): Number of overlapping samples. Defaults to 512.
-        power_threshold (float, optional): Power threshold in dB. Defaults to -50 dB.
+        carrier_freq (float, optional): Radar carrier frequency in Hz. Defaults to CONFIG.carrier_freq.
+        windows (list of (int, int), optional): Only compute frames inside these sample ranges
+            (see find_event_windows). Defaults to the whole signal.
 
     Returns:
         freqs (ndarray): Frequency bins.
@@ -107,29 +722,31 @@ def compute_spectrogram_and_max_freq(signal, sampling_rate, nfft=1024, noverlap=
     signal = signal / np.max(signal)
 
 
-    # Compute spectrogram
-    freqs, times, Sxx = spectrogram(signal, fs=sampling_rate, nperseg=nfft, noverlap=noverlap, return_onesided=False)
-
-    # Shift frequencies to center zero frequency
-    freqs = np.fft.fftshift(freqs)
-    Sxx = np.fft.fftshift(Sxx, axes=0)
+    with fft_backend():
+        if CONFIG.spectral_engine == "zoom":
+            # only the bins a projectile can occupy, already in ascending order
+            freqs, times, Sxx = zoom_spectrogram(signal, sampling_rate, nfft, noverlap, carrier_freq, windows)
+        else:
+            freqs, times, Sxx = full_spectrogram(signal, sampling_rate, nfft, noverlap, windows)
 
     # Convert power to dB
     Sxx_dB = 10 * np.log10(Sxx + 1e-10)  # Add small value to avoid log(0)
 
     # Find dominant frequency at each time step
-    max_freq_indices = np.argmax(Sxx, axis=0)  # Find index of max power in each time step
+    if CONFIG.spectral_engine == "zoom":
+        max_freq_indices = np.argmax(Sxx, axis=0)  # Find index of max power in each time step
+    else:
+        # only bins inside the Doppler band can win, the spectrogram itself stays whole
+        rows = doppler_band_rows(freqs, sampling_rate, nfft, carrier_freq)
+        max_freq_indices = rows[np.argmax(Sxx[rows], axis=0)]
     max_powers = Sxx_dB[max_freq_indices, np.arange(len(times))]  # Get corresponding power values
+    # the zoom engine's two halves are separate bands, not one circular spectrum
+    band_bins = len(freqs) // 2 if CONFIG.spectral_engine == "zoom" else None
+    offsets = interpolate_peaks(Sxx.T, max_freq_indices, band_bins=band_bins)
 
-    # find the max of max_powers
-    max_max_powers = max(max_powers)
-    power_threshold = max_max_powers - 5
-    print(f"power_threshold: {power_threshold}")
-
-    # Apply threshold: If max power < threshold, set frequency to 0
-    max_freqs = freqs[max_freq_indices] * (max_powers > power_threshold)
+    max_freqs = threshold_max_freqs(freqs, max_freq_indices, max_powers, offsets)
 
-    freqs = (freqs * c) / (2 * 85e9 + freqs)
+    freqs = doppler_to_velocity(freqs, carrier_freq)
 
     # plot the spectrogram
     # plt.figure(figsize=(10, 6))
@@ -143,47 +760,525 @@ def compute_spectrogram_and_max_freq(signal, sampling_rate, nfft=1024, noverlap=
     return freqs, times, Sxx, max_freqs
 
 
-# do stuff
+def velocity_to_doppler(velocity, carrier_freq=None):
+    """
+    Converts radial velocities to Doppler frequencies; the inverse of doppler_to_velocity.
+
+    Args:
+        velocity (array-like): Velocities (in m/s).
+        carrier_freq (float, optional): Radar carrier frequency (in Hz). Defaults to CONFIG.carrier_freq.
+
+    Returns:
+        ndarray: Doppler frequencies (in Hz).
+    """
+    if carrier_freq is None:
+        carrier_freq = CONFIG.carrier_freq
+    return 2 * carrier_freq * velocity / (c - velocity)
+
+def doppler_to_velocity(freqs, carrier_freq=None):
+    """
+    Converts Doppler frequencies to radial velocities.
+
+    Args:
+        freqs (array-like): Doppler frequencies (in Hz).
+        carrier_freq (float, optional): Radar carrier frequency (in Hz). Defaults to CONFIG.carrier_freq.
+
+    Returns:
+        ndarray: Velocities (in m/s).
+    """
+    if carrier_freq is None:
+        carrier_freq = CONFIG.carrier_freq
+    return (freqs * c) / (2 * carrier_freq + freqs)
+
+def interpolate_peaks(power, indices, estimator=None, band_bins=None):
+    """
+    Estimates where each frame's peak lies between FFT bins, for all frames at once.
+
+    A parabola is fitted through the peak bin and its two neighbours; its vertex gives the
+    offset from the peak bin. "parabolic" fits the magnitude, "gaussian" fits log power (exact
+    for a Gaussian-shaped peak and the closer fit for the Tukey window used here); "argmax"
+    keeps the peak bin. Neighbours wrap around, as the two-sided spectrum is circular,
+    unless band_bins is given.
+
+    Args:
+        power (ndarray): Power spectra, frames x bins.
+        indices (ndarray): Index of the peak bin in each frame.
+        estimator (str, optional): "argmax", "parabolic" or "gaussian". Defaults to CONFIG.peak_estimator.
+        band_bins (int, optional): Bins per separate band (the zoom engine's two halves).
+            Neighbours are never taken across a band edge; a peak on one keeps its bin.
+
+    Returns:
+        ndarray: Offset of each peak from its bin, in bins, within [-0.5, 0.5].
+    """
+    if estimator is None:
+        estimator = CONFIG.peak_estimator
+    if estimator == "argmax":
+        return np.zeros(len(indices))
+
+    n_bins = power.shape[1]
+    frames = np.arange(len(indices))
+    left = power[frames, (indices - 1) % n_bins]
+    center = power[frames, indices]
+    right = power[frames, (indices + 1) % n_bins]
+    at_edge = np.zeros(len(indices), dtype=bool)
+    if band_bins is not None:
+        position = indices % band_bins
+        at_edge = (position == 0) | (position == band_bins - 1)
+
+    if estimator == "parabolic":
+        left, center, right = np.sqrt(left), np.sqrt(center), np.sqrt(right)
+    elif estimator == "gaussian":
+        tiny = np.finfo(power.dtype).tiny
+        left, center, right = np.log(left + tiny), np.log(center + tiny), np.log(right + tiny)
+    else:
+        raise ValueError(f"unknown peak estimator: {estimator}")
+
+    curvature = left - 2 * center + right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        offsets = 0.5 * (left - right) / curvature
+    # a flat or inverted fit has no vertex to move to, keep the bin
+    offsets = np.where((curvature < 0) & ~at_edge, offsets, 0.0)
+    return np.clip(offsets, -0.5, 0.5)
 
-def process_data(display_spectrogram=True):
-    decimation = CONFIG.decimation
+def threshold_max_freqs(freqs, max_freq_indices, max_powers, offsets=None):
+    """
+    Turns the per-frame peak bins into dominant frequencies, zeroing frames that are more
+    than 5 dB below the strongest frame.
+
+    Args:
+        freqs (ndarray): Frequency bins (fftshifted).
+        max_freq_indices (ndarray): Index of the peak bin in each frame.
+        max_powers (ndarray): Power of each frame's peak in dB.
+        offsets (ndarray, optional): Sub-bin position of each peak (see interpolate_peaks).
+
+    Returns:
+        ndarray: Dominant frequency at each time step (zero if below threshold).
+    """
+    # find the max of max_powers
+    max_max_powers = max(max_powers)
+    power_threshold = max_max_powers - 5
+    print(f"power_threshold: {power_threshold}")
+
+    peak_freqs = freqs[max_freq_indices]
+    if offsets is not None:
+        peak_freqs = peak_freqs + offsets * (freqs[1] - freqs[0])
+
+    # Apply threshold: If max power < threshold, set frequency to 0
+    return peak_freqs * (max_powers > power_threshold)
+
+class StreamingSpectrogram:
+    """
+    Two-sided spectrogram computed frame by frame as the signal arrives in blocks.
+
+    Matches scipy.signal.spectrogram's defaults (Tukey window, per-frame mean removal,
+    density scaling), or zoom_spectrogram with CONFIG.spectral_engine set to "zoom".
+    Samples that do not fill a frame yet are carried to the next block.
+    Only each frame's peak is kept unless keep_spectrogram is set; the kept spectrogram is
+    max-pooled column_frames frames to a column as they arrive, as downsample_spectrogram
+    would, so it stays display-sized however long the signal is.
+    """
+    def __init__(self, sampling_rate, nfft=1024, noverlap=512, keep_spectrogram=False, carrier_freq=None, column_frames=1):
+        self.sampling_rate = sampling_rate
+        self.carrier_freq = carrier_freq
+        self.nfft = nfft
+        self.step = nfft - noverlap
+        self.window = stft_window(nfft).astype(dsp_real_dtype(), copy=False)
+        self.scale = 1.0 / (sampling_rate * np.sum(self.window ** 2))
+        self.keep_spectrogram = keep_spectrogram
+        self.column_frames = max(1, column_frames)
+        self.transforms = None
+        if CONFIG.spectral_engine == "zoom":
+            self.transforms, self.zoom_freqs = zoom_transforms(nfft, sampling_rate, *doppler_band(sampling_rate, nfft, carrier_freq))
+        else:
+            self.band_rows = doppler_band_rows(np.fft.fftshift(np.fft.fftfreq(nfft, 1 / sampling_rate)),
+                                               sampling_rate, nfft, carrier_freq)
+
+        self.pending = np.zeros(0, dtype=np.complex64)
+        self.signal_max = None
+        self.peak_indices = []
+        self.peak_offsets = []
+        self.peak_powers = []
+        self.columns = []
+        self.unpooled = None
+        self.spectrogram_times = None
+
+    def process(self, data):
+        """
+        Adds the next block of the signal and computes every frame it completes.
+
+        Args:
+            data (array-like): The next samples.
+        """
+        if len(data) == 0:
+            return
+
+        # track np.max(signal) (complex max) for the same normalization as the batch path
+        block_max = np.max(data)
+        self.signal_max = block_max if self.signal_max is None else np.max([self.signal_max, block_max])
+
+        self.pending = np.concatenate((self.pending, data))
+        if len(self.pending) < self.nfft:
+            return
+
+        n_frames = (len(self.pending) - self.nfft) // self.step + 1
+        segments = sliding_window_view(self.pending, self.nfft)[::self.step][:n_frames]
+        segments = segments - segments.mean(axis=1, keepdims=True)
+        with fft_backend():
+            if self.transforms is not None:
+                power = (np.abs(zoom_spectrum(segments * self.window, self.transforms)) ** 2 * self.scale).astype(self.window.dtype, copy=False)
+            else:
+                # scipy's FFT keeps complex64 frames in single precision, numpy's would not
+                power = np.abs(scipy.fft.fft(segments * self.window, axis=1)) ** 2 * self.scale
+                power = np.fft.fftshift(power, axes=1)
+
+        if self.transforms is not None:
+            indices = np.argmax(power, axis=1)
+        else:
+            indices = self.band_rows[np.argmax(power[:, self.band_rows], axis=1)]
+        self.peak_indices.append(indices)
+        band_bins = power.shape[1] // 2 if self.transforms is not None else None
+        self.peak_offsets.append(interpolate_peaks(power, indices, band_bins=band_bins))
+        self.peak_powers.append(power[np.arange(n_frames), indices])
+        if self.keep_spectrogram:
+            self.pool(power)
+
+        self.pending = self.pending[n_frames * self.step:]
+
+    def pool(self, power):
+        """Folds frames (frames x bins) into spectrogram columns, holding back an incomplete one."""
+        if self.unpooled is not None:
+            power = np.concatenate((self.unpooled, power))
+        n_columns = len(power) // self.column_frames
+        if n_columns:
+            done = power[:n_columns * self.column_frames]
+            self.columns.append(done.reshape(n_columns, self.column_frames, -1).max(axis=1))
+        self.unpooled = power[n_columns * self.column_frames:]
+
+    def finish(self):
+        """
+        Returns the same results as compute_spectrogram_and_max_freq for the whole signal.
+        The times of the spectrogram's columns are left in spectrogram_times.
+
+        Returns:
+            freqs (ndarray): Velocity bins (m/s).
+            times (ndarray): Time bins.
+            Sxx (ndarray or None): Spectrogram power, None unless keep_spectrogram was set.
+            max_freqs (ndarray): Dominant frequency at each time step (zero if below threshold).
+        """
+        if self.transforms is not None:
+            freqs = self.zoom_freqs
+        else:
+            freqs = np.fft.fftshift(np.fft.fftfreq(self.nfft, 1 / self.sampling_rate))
+        max_freq_indices = np.concatenate(self.peak_indices)
+        times = (self.nfft / 2 + np.arange(len(max_freq_indices)) * self.step) / self.sampling_rate
+
+        # undo the normalization by the signal maximum that the batch path applies up front
+        norm = np.abs(self.signal_max) ** 2
+        max_powers = 10 * np.log10(np.concatenate(self.peak_powers) / norm + 1e-10)
+        max_freqs = threshold_max_freqs(freqs, max_freq_indices, max_powers, np.concatenate(self.peak_offsets))
+
+        Sxx = None
+        if self.keep_spectrogram:
+            if self.unpooled is not None and len(self.unpooled):
+                self.columns.append(self.unpooled.max(axis=0, keepdims=True))
+                self.unpooled = None
+            Sxx = np.concatenate(self.columns).T / norm
+            self.spectrogram_times = times[::self.column_frames]
+
+        freqs = doppler_to_velocity(freqs, self.carrier_freq)
+        return freqs, times, Sxx, max_freqs
+
+def stream_spectrogram(capture, decimation, keep_spectrogram=False, block_size=None, start=0, stop=None, progress=None,
+                       max_columns=800):
+    """
+    Runs the high-pass, decimation and spectrogram stages over a capture one block at a time.
+
+    Filter state is carried between blocks (sosfilt's zi and the decimator's history), so
+    the result equals the in-memory pipeline while peak memory depends only on block_size.
+    Every frame is computed: CONFIG.roi_gating needs the whole signal to find its windows
+    and is not applied here. A kept spectrogram is max-pooled to about max_columns columns.
+
+    Args:
+        capture (CaptureReader): The capture to process.
+        decimation (int): The decimation factor to apply to the stored samples.
+        keep_spectrogram (bool, optional): Keep the full spectrogram for display. Defaults to False.
+        block_size (int, optional): Samples per block. Defaults to CONFIG.stream_block_size.
+        start (int, optional): First capture sample to process. Defaults to 0.
+        stop (int, optional): Capture sample to stop at. Defaults to the end of the capture.
+        progress (callable, optional): Called as progress(stage, fraction) after each block.
+        max_columns (int, optional): Most spectrogram columns to keep. Defaults to 800.
+
+    Returns:
+        Same as StreamingSpectrogram.finish(), with times relative to sample start, followed
+        by the times of the spectrogram's columns (None unless keep_spectrogram is set).
+    """
+    if block_size is None:
+        block_size = CONFIG.stream_block_size
+    if stop is None:
+        stop = len(capture)
+
+    input_rate = capture.sampling_rate
+    sampling_rate = input_rate / decimation
+
+    decimator = MultistageDecimator(decimation, input_rate, 0.25 * sampling_rate)
+    highpass_late = highpass_after_decimation(CONFIG.high_pass_cutoff, sampling_rate)
+    sos = chebyshev_highpass_sos(CONFIG.high_pass_cutoff, sampling_rate if highpass_late else input_rate).astype(dsp_real_dtype(), copy=False)
+    zi = np.zeros((sos.shape[0], 2), dtype=np.result_type(sos.dtype, np.complex64))
+    n_frames = ((stop - start) // decimation - CONFIG.fft_size) // (CONFIG.fft_size - CONFIG.fft_overlap) + 1
+    stft = StreamingSpectrogram(sampling_rate, CONFIG.fft_size, CONFIG.fft_overlap, keep_spectrogram, capture.carrier_freq,
+                                column_frames=-(-n_frames // max_columns))
+
+    def highpass(block):
+        nonlocal zi
+        block, zi = sosfilt(sos, block, zi=zi)
+        return block
+
+    done = 0
+    for block in capture.blocks(block_size, start, stop):
+        if highpass_late:
+            stft.process(highpass(decimator.process(block)))
+        else:
+            stft.process(decimator.process(highpass(block)))
+        done += len(block)
+        if progress is not None:
+            progress("streaming", done / max(stop - start, 1))
+
+    tail = decimator.flush()
+    stft.process(highpass(tail) if highpass_late else tail)
+
+    return stft.finish() + (stft.spectrogram_times,)
+
+def warm_design_cache(input_rate=None, decimation=None):
+    """
+    Designs every filter and window process_data will need for the current CONFIG, so the
+    first capture after a settings change does not pay for them. With parallel filtering
+    on, the worker pool is started too.
+
+    Args:
+        input_rate (float, optional): Sampling rate of the stored samples. Defaults to the
+            rate the next capture will be stored at.
+        decimation (int, optional): The decimation left to apply to them. Defaults to what
+            analyze_capture will apply to the next capture.
+    """
+    # with CONFIG.flowgraph_decimation the capture is stored already decimated, and
+    # analyze_capture only applies what is left (see CaptureReader.remaining_decimation)
+    stored_decimation = CONFIG.decimation if CONFIG.flowgraph_decimation else 1
+    if input_rate is None:
+        input_rate = CONFIG.samp_rate / stored_decimation
+    if decimation is None:
+        decimation = max(1, int(round(CONFIG.decimation / stored_decimation)))
+
+    sampling_rate = input_rate / decimation
+    MultistageDecimator(decimation, input_rate, 0.25 * sampling_rate)
+    if highpass_after_decimation(CONFIG.high_pass_cutoff, sampling_rate):
+        chebyshev_highpass_sos(CONFIG.high_pass_cutoff, sampling_rate)
+    else:
+        chebyshev_highpass_sos(CONFIG.high_pass_cutoff, input_rate)
+    stft_window(CONFIG.fft_size)
+    if CONFIG.spectral_engine == "zoom":
+        try:
+            zoom_transforms(CONFIG.fft_size, sampling_rate, *doppler_band(sampling_rate, CONFIG.fft_size))
+        except ValueError:
+            pass  # a band above Nyquist is reported when the capture is analysed
+    if CONFIG.parallel_filtering:
+        parallel_pool()
+
+def analyze_capture(file_name=None, start_time=None, stop_time=None, keep_spectrogram=True, progress=None):
+    """
+    Filters, decimates and analyzes a capture.
+
+    start_time and stop_time (in s from the start of the capture) restrict processing to a
+    window; the capture is memory-mapped, so only that part of the file is read.
+
+    Args:
+        file_name (str, optional): The capture to process. Defaults to CONFIG.file_name.
+        start_time (float, optional): Start of the window to process (in s).
+        stop_time (float, optional): End of the window to process (in s).
+        keep_spectrogram (bool, optional): Keep the spectrogram for display. Defaults to True.
+        progress (callable, optional): Called as progress(stage, fraction) as each stage
+            starts, with fraction the share of the work done so far. Runs on the calling thread.
+
+    Returns:
+        dict: max_velocity, velocities and times per frame, the velocity bins, the
+        spectrogram Sxx (None if not kept) and the times of its columns (spectrogram_times,
+        fewer than times when streaming pooled them), the decimated sampling_rate and file_name.
+    """
+    if file_name is None:
+        file_name = CONFIG.file_name
+    if progress is None:
+        progress = lambda stage, fraction: None
+
+    # rates, carrier and decimation come from the capture's header when it has one
+    capture = open_capture(file_name)
+    input_rate = capture.sampling_rate
+    decimation = capture.remaining_decimation(CONFIG.decimation)
 
     # Sampling rate in Hz
-    sampling_rate = 6e6 / decimation  # 4 million samples per second
+    sampling_rate = input_rate / decimation
+    # low-pass edge at a quarter of the decimated rate (1.5 MHz / decimation at 6 MS/s)
+    cutoff_freq = 0.25 * sampling_rate
+
+    start = 0 if start_time is None else capture.sample_index(start_time)
+    stop = len(capture) if stop_time is None else capture.sample_index(stop_time)
+
+    if CONFIG.streaming:
+        freqs, times, Sxx, max_freqs, spectrogram_times = stream_spectrogram(capture, decimation, keep_spectrogram=keep_spectrogram,
+                                                                             start=start, stop=stop, progress=progress)
+    else:
+        f_prime = capture.samples(start, stop)
+        if CONFIG.parallel_filtering:
+            highpass_late = highpass_after_decimation(CONFIG.high_pass_cutoff, sampling_rate)
+            progress("filtering", 0.0)
+            f = filter_decimate_parallel(f_prime, decimation, input_rate, cutoff_freq,
+                                         None if highpass_late else CONFIG.high_pass_cutoff)
+            if highpass_late:
+                progress("high-pass", 0.6)
+                f = highpass_chebyshev(f, CONFIG.high_pass_cutoff, sampling_rate)
+        elif highpass_after_decimation(CONFIG.high_pass_cutoff, sampling_rate):
+            # decimate first so the high-pass runs at the low rate too
+            progress("decimating", 0.0)
+            f_low = decimate_multistage(f_prime, decimation, input_rate, cutoff_freq)
+            progress("high-pass", 0.6)
+            f = highpass_chebyshev(f_low, CONFIG.high_pass_cutoff, sampling_rate)
+        else:
+            progress("high-pass", 0.0)
+            f_high = highpass_chebyshev(f_prime, CONFIG.high_pass_cutoff, input_rate)
+            progress("decimating", 0.4)
+            f = decimate_multistage(f_high, decimation, input_rate, cutoff_freq)
 
-    f_prime = np.fromfile(open(CONFIG.file_name), dtype=np.complex64)
-    f_high = highpass_chebyshev(f_prime, CONFIG.high_pass_cutoff, 6e6)
-    f = lowpass_filter_decimate(f_high, 1.5e6/decimation, 6e6, decimation, 6)
+        progress("spectrogram", 0.8)
+        windows = None
+        if CONFIG.roi_gating:
+            # only run the spectrogram where there is Doppler energy
+            windows = find_event_windows(f, sampling_rate, CONFIG.fft_size, CONFIG.fft_overlap, CONFIG.roi_threshold_db, CONFIG.roi_margin)
 
-    freqs, times, Sxx, max_freqs = compute_spectrogram_and_max_freq(f, sampling_rate, CONFIG.fft_size, CONFIG.fft_overlap)
+        freqs, times, Sxx, max_freqs = compute_spectrogram_and_max_freq(f, sampling_rate, CONFIG.fft_size, CONFIG.fft_overlap, capture.carrier_freq, windows)
+        spectrogram_times = times
 
-    velocities = (max_freqs * c) / (2 * 85e9 + max_freqs)
+    times = times + start / input_rate  # times relative to the start of the capture
+    if spectrogram_times is not None:
+        spectrogram_times = spectrogram_times + start / input_rate
+
+    velocities = doppler_to_velocity(max_freqs, capture.carrier_freq)
 
     # plt.plot(velocities)
     # plt.show()
 
     print(f"max velocity: {max(abs(velocities))}")
+    progress("done", 1.0)
 
+    return {
+        "max_velocity": max(abs(velocities)),
+        "velocities": velocities,
+        "times": times,
+        "velocity_bins": freqs,
+        "Sxx": Sxx,
+        "spectrogram_times": spectrogram_times,
+        "sampling_rate": sampling_rate,
+        "file_name": file_name,
+    }
 
-    plt.figure(figsize=(10, 6))
+def downsample_spectrogram(times, Sxx, frame_step, max_columns=800, max_rows=512):
+    """
+    Shrinks a spectrogram to roughly screen resolution for display.
 
-    plt.specgram(f, NFFT=CONFIG.fft_size, Fs=sampling_rate, noverlap=CONFIG.fft_overlap, cmap='inferno')
-    plt.title('Spectrogram of RADAR Data')
-    plt.xlabel('Time (seconds)')
-    plt.ylabel('Frequency')
+    Neighbouring bins and frames are combined by taking their maximum, so a short, narrow
+    Doppler streak survives the reduction. Gaps between gated windows (see
+    find_event_windows) are filled with NaN columns so they show up blank instead of stretched.
 
-    plt.colorbar(label='Intensity (dB)')
+    Args:
+        times (ndarray): Frame times.
+        Sxx (ndarray): Spectrogram power, bins x frames.
+        frame_step (float): Time between consecutive frames (in s).
+        max_columns (int, optional): Most frames to keep. Defaults to 800.
+        max_rows (int, optional): Most frequency bins to keep. Defaults to 512.
 
-    plt.tight_layout()
+    Returns:
+        row_factor (int): How many bins were combined into each row.
+        times (ndarray): Times of the kept columns.
+        Sxx (ndarray): The reduced spectrogram.
+    """
+    n_rows, n_frames = Sxx.shape
+    row_factor = -(-n_rows // max_rows)
+    col_factor = -(-n_frames // max_columns)
+
+    if row_factor > 1:
+        pad = -n_rows % row_factor
+        Sxx = np.pad(Sxx, ((0, pad), (0, 0)), constant_values=np.nan)
+        Sxx = np.nanmax(Sxx.reshape(-1, row_factor, Sxx.shape[1]), axis=1)
+    if col_factor > 1:
+        pad = -n_frames % col_factor
+        Sxx = np.pad(Sxx, ((0, 0), (0, pad)), constant_values=np.nan)
+        Sxx = np.nanmax(Sxx.reshape(Sxx.shape[0], -1, col_factor), axis=2)
+        times = times[::col_factor]
+        frame_step = frame_step * col_factor
+
+    gaps = np.flatnonzero(np.diff(times) > 1.5 * frame_step)
+    if len(gaps):
+        # a blank column just after each window and just before the next one
+        edges = np.column_stack((times[gaps] + frame_step, times[gaps + 1] - frame_step)).ravel()
+        Sxx = np.insert(Sxx, np.repeat(gaps + 1, 2), np.nan, axis=1)
+        times = np.insert(times, np.repeat(gaps + 1, 2), edges)
+
+    return row_factor, times, Sxx
+
+def plot_spectrogram(result, figure=None):
+    """
+    Draws the spectrogram computed by analyze_capture, without computing it again.
+
+    Args:
+        result (dict): The output of analyze_capture.
+        figure (matplotlib.figure.Figure, optional): Figure to draw into, e.g. one embedded in
+            the GUI. Defaults to a new pyplot figure.
+
+    Returns:
+        matplotlib.figure.Figure: The figure drawn into.
+    """
+    if figure is None:
+        figure = plt.figure(figsize=(10, 6))
+    figure.clf()
+    ax = figure.add_subplot(111)
+
+    ax.set_title('Spectrogram of RADAR Data')
+    ax.set_xlabel('Time (seconds)')
+    ax.set_ylabel('Velocity (m/s)')
+
+    Sxx = result["Sxx"]
+    if Sxx is None or Sxx.size == 0:
+        return figure
+
+    times = result.get("spectrogram_times", result["times"])
+    # streaming may have pooled frames already; gaps only ever widen the step between columns
+    frame_step = np.min(np.diff(times)) if len(times) > 1 else (CONFIG.fft_size - CONFIG.fft_overlap) / result["sampling_rate"]
+    row_factor, times, Sxx = downsample_spectrogram(times, Sxx, frame_step)
+    velocity_bins = result["velocity_bins"][::row_factor][:Sxx.shape[0]]
+
+    # Convert power to dB
+    with np.errstate(invalid='ignore'):
+        Sxx_dB = 10 * np.log10(Sxx + 1e-10)
+
+    mesh = ax.pcolormesh(times, velocity_bins, Sxx_dB, shading='nearest', cmap='inferno')
+    figure.colorbar(mesh, ax=ax, label='Intensity (dB)')
+    figure.tight_layout()
+    return figure
+
+# do stuff
+
+def process_data(display_spectrogram=True, start_time=None, stop_time=None):
+    """
+    Analyzes CONFIG.file_name (see analyze_capture), optionally shows its spectrogram in a
+    matplotlib window, and returns the max velocity.
+    """
+    result = analyze_capture(CONFIG.file_name, start_time, stop_time, keep_spectrogram=display_spectrogram)
 
     if (display_spectrogram):
+        plot_spectrogram(result)
         plt.show()
 
     print(f"finished processing data from {CONFIG.file_name}")
-    return max(abs(velocities)) # return max velocity
+    return result["max_velocity"] # return max velocity
 
 
 
 if __name__ == "__main__":
-    process_data()
-
+    process_data()
\ No newline at end of file
@@ -4,17 +4,98 @@ import sys
 import numpy as np
 import time
 import threading
+import queue
+import os
+import json
 from config import CONFIG
+from capture import capture_metadata, write_capture_header
+
+
+def stats_filename(filename):
+    """Sidecar file holding the acquisition stats of a capture."""
+    return os.path.splitext(filename)[0] + ".stats.json"
+
+
+def latency_percentile(histogram, fraction):
+    """
+    Upper edge (in s) of the fifo_queue latency histogram bin holding the given fraction of
+    work() calls, e.g. 0.99 for the 99th percentile. None if there were no calls.
+    """
+    counts = np.cumsum(histogram)
+    if counts[-1] == 0:
+        return None
+    bucket = int(np.searchsorted(counts, fraction * counts[-1]))
+    return 2 ** bucket / 1e6
+
+
+class CaptureWriter:
+    """
+    Dedicated thread that writes captures to disk so the radar never waits on file I/O.
+
+    Jobs are (filename, segments, on_done, metadata, stats) tuples. The capture header is
+    written first when metadata is given, then the segments in order with tofile(), straight
+    from the memory they live in. Each capture is written to a temporary file and renamed
+    into place, so a reader still processing an older capture of the same name is unaffected.
+    stats, if given, go next to the capture in a <name>.stats.json sidecar.
+    """
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, filename, segments, on_done=None, metadata=None, stats=None):
+        self.jobs.put((filename, segments, on_done, metadata, stats))
+
+    def wait(self):
+        """Blocks until every submitted capture has been written."""
+        self.jobs.join()
+
+    def busy(self):
+        return self.jobs.unfinished_tasks > 0
+
+    def run(self):
+        while True:
+            filename, segments, on_done, metadata, stats = self.jobs.get()
+            success = False
+            try:
+                partial = filename + ".part"
+                with open(partial, "wb") as f:  # Open in write binary mode ("wb") to overwrite
+                    if metadata is not None:
+                        write_capture_header(f, metadata)
+                    for segment in segments:
+                        segment.tofile(f)
+                os.replace(partial, filename)
+                if stats is not None:
+                    with open(stats_filename(filename), "w") as f:
+                        json.dump(stats, f, indent=2)
+                print(f"Buffer written to {filename}")
+                success = True
+            except Exception as e:
+                print(f"Error writing to file: {e}")
+
+            if on_done is not None:
+                on_done(filename, success)
+            self.jobs.task_done()
 
 
 class RADAR_TOP:
-    begin_save_buffer = False
     currently_saving_buffer = False
 
     tb = None
 
     def __init__(self):
-        self.begin_save_buffer = False
+        self.writer = CaptureWriter()
+
+        # arm -> trigger -> save -> done, all signalled through events so nothing spins
+        self.trigger_event = threading.Event()  # set by trigger() or disarm()
+        self.disarm_event = threading.Event()   # set by disarm() to abandon a pending save
+        self.save_done = threading.Event()      # set once the capture is on disk
+
+        # optional callable(filename, success), run on the writer thread when a save finishes
+        self.on_save_complete = None
+        # optional callable(), run on the flowgraph thread after the software trigger fires
+        self.on_software_trigger = None
+        self.armed_at = None
 
     def start_radar(self):
         """Function to start the radar and handle signals"""
@@ -29,36 +110,195 @@ class RADAR_TOP:
         self.tb.start()
         return True
 
+    def trigger(self, offset=None, source="manual"):
+        """
+        Requests that the current buffer be saved. Safe to call from any thread.
+
+        The trigger is tagged onto the sample stream, at `offset` when the source knows
+        where in the stream it fired, otherwise at the next sample through the flowgraph.
+        """
+        if self.trigger_event.is_set():
+            return False
+        self.currently_saving_buffer = True
+        self.save_done.clear()
+        if self.tb is not None:
+            self.tb.tagger_block.fire(offset, source)
+        self.trigger_event.set()
+        return True
+
+    def software_triggered(self, offset):
+        """Called by the flowgraph's software trigger block when it detects a shot."""
+        if self.trigger_event.is_set() or self.tb is None:
+            return
+        self.trigger(self.tb.live_to_stream_offset(offset), "software")
+        if self.on_software_trigger is not None:
+            self.on_software_trigger()
+
     def save_buffer(self):
+        # disarm may close the session while this thread is still saving, so the flowgraph
+        # is held from here on rather than looked up again through self.tb
+        tb = self.tb
+        submitted = False
+        try:
+            # Sleep until triggered (or disarmed) instead of polling a flag
+            self.trigger_event.wait()
+            if self.disarm_event.is_set() or tb is None:
+                print("Disarmed before trigger, nothing saved")
+                return False
 
-        # Don't start saving to file until flag is set
-        while (not self.begin_save_buffer):
-            pass
+            self.currently_saving_buffer = True
+            submitted = self.write_capture(tb)
+            return submitted
+        finally:
+            if not submitted:
+                # buffer_written will not run, release the trigger here instead
+                self.currently_saving_buffer = False
+                self.save_done.set()
 
-        self.currently_saving_buffer = True
-        time.sleep(CONFIG.symetric_record_time)  # Wait for 1 second before saving
-        print(f"creating buffer from the queue block...")
-        buffer = self.tb.queue_block.buffer
+    def write_capture(self, tb):
+        """Waits for the post-trigger samples, then hands the frozen buffer to the writer."""
+        queue_block = tb.queue_block
+        # The queue block freezes itself once the post-trigger samples are in; disarm
+        # freezes it early. The timeout only guards against a stalled flowgraph.
+        if not queue_block.capture_complete.wait(CONFIG.post_trigger_time + 1.0):
+            print("Trigger tag never reached the queue block, saving what is buffered")
+        print(f"freezing buffer in the queue block...")
         filename = CONFIG.file_name
 
-        print(f"creating copy of buffer")
-        buffer_copy = np.array(list(buffer))  # Create a copy for writing
-        try:
-            with open(filename, "wb") as f:  # Open in write binary mode ("wb") to overwrite
-                buffer_copy.tofile(f)
-            print(f"Buffer written to {filename}")
-        except Exception as e:
-            print(f"Error writing to file: {e}")
+        # the ring is already stopped, its contents are written out in place, no copy needed
+        segments = queue_block.freeze()
+        n_samples = sum(len(segment) for segment in segments)
+
+        metadata = capture_metadata(trigger_index=queue_block.trigger_index, n_samples=n_samples,
+                                    decimation=tb.get_decimation1(), samp_rate=tb.get_samp_rate())
+        metadata["trigger_source"] = queue_block.trigger_source
+        metadata["pre_trigger_time"] = CONFIG.pre_trigger_time
+        metadata["post_trigger_time"] = CONFIG.post_trigger_time
+        self.writer.submit(filename, segments, self.buffer_written, metadata, self.stats(tb))
+        return True
 
+    def buffer_written(self, filename, success):
+        """Called from the writer thread once a capture is on disk."""
         # self.disarm()
         print("stop buffer save")
         self.currently_saving_buffer = False
+        self.save_done.set()
+        if self.on_save_complete is not None:
+            self.on_save_complete(filename, success)
+
+    def session_open(self):
+        """True while a flowgraph is built and streaming."""
+        return self.tb is not None
+
+    def open_session(self):
+        """Builds the flowgraph and starts the SDR streams."""
+        top_block_cls = RADAR
+        self.tb = top_block_cls()
+        self.tb.trigger_block.callback = self.software_triggered
+
+        # Start the radar in a separate thread
+        radar_thread = threading.Thread(target=self.start_radar, args=())
+        radar_thread.daemon = True  # Ensures the thread exits when the main program exits
+        radar_thread.start()
         return True
 
-    def disarm(self):
-        print("Disarming radar...")
+    def close_session(self):
+        """Stops the flowgraph and releases the SDR."""
+        if self.tb is None:
+            return False
+        print("Closing radar session...")
         self.tb.stop()
         self.tb.wait()
+        self.tb = None
+        return True
+
+    def reset_capture(self):
+        """Starts a fresh capture in the running flowgraph's buffer."""
+        queue_block = self.tb.queue_block
+        if self.writer.busy():
+            # the writer still holds views into the ring, give the block a new one
+            queue_block.set_capacity(queue_block.capacity)
+        else:
+            queue_block.reset()
+
+    def stats(self, tb=None):
+        """
+        Acquisition health: how many samples arrived against how many the sample rate
+        promises, overflows flagged by the SDR, the capture buffer's fill level and the
+        queue block's work() latencies. None when no flowgraph is running.
+        """
+        if tb is None:
+            tb = self.tb
+        if tb is None:
+            return None
+        queue_stats = tb.queue_block.stats()
+        samp_rate = tb.get_samp_rate()
+        # the buffer receives the stream after the flowgraph's decimation
+        queue_rate = samp_rate / tb.get_decimation1()
+        elapsed = queue_stats["time_since_reset"]
+        expected = int(queue_rate * elapsed)
+        histogram = queue_stats["latency_histogram_us"]
+
+        return dict(queue_stats,
+            samp_rate=samp_rate,
+            queue_rate=queue_rate,
+            replay=bool(tb.replay_file),
+            time_since_arm=None if self.armed_at is None else time.monotonic() - self.armed_at,
+            receive_rate=queue_stats["samples_received"] / elapsed if elapsed > 0 else 0.0,
+            expected_samples=expected,
+            sample_deficit=max(0, expected - queue_stats["samples_received"]),
+            fill_fraction=queue_stats["fill_level"] / queue_stats["capacity"],
+            latency_p50=latency_percentile(histogram, 0.5),
+            latency_p99=latency_percentile(histogram, 0.99),
+            trigger_index=tb.queue_block.trigger_index,
+            trigger_source=tb.queue_block.trigger_source,
+        )
+
+    def live_velocity(self):
+        """Latest live velocity estimate from the flowgraph, None when it is not running."""
+        if self.tb is None:
+            return None
+        return self.tb.doppler_block.stats()
+
+    def apply_settings(self):
+        """Pushes CONFIG into the running flowgraph instead of rebuilding it."""
+        if self.tb is None:
+            return False
+        tb = self.tb
+        if tb.get_gain() != CONFIG.sdr_gain:
+            tb.set_gain(CONFIG.sdr_gain)
+        if tb.get_rf_freq() != CONFIG.rf_freq:
+            tb.set_rf_freq(CONFIG.rf_freq)
+        if tb.get_freq() != CONFIG.transmit_freq:
+            tb.set_freq(CONFIG.transmit_freq)
+        # a replay runs at the rate in its file header, whatever CONFIG.samp_rate says
+        if not tb.replay_file and tb.get_samp_rate() != CONFIG.samp_rate:
+            tb.set_samp_rate(CONFIG.samp_rate)
+        if tb.get_pre_trigger_time() != CONFIG.pre_trigger_time:
+            tb.set_pre_trigger_time(CONFIG.pre_trigger_time)
+        if tb.get_post_trigger_time() != CONFIG.post_trigger_time:
+            tb.set_post_trigger_time(CONFIG.post_trigger_time)
+        doppler_block = tb.doppler_block
+        if (doppler_block.fft_size, doppler_block.fft_overlap) != (CONFIG.fft_size, CONFIG.fft_overlap):
+            doppler_block.set_fft_size(CONFIG.fft_size, CONFIG.fft_overlap)
+        if doppler_block.min_freq != CONFIG.high_pass_cutoff:
+            doppler_block.set_min_freq(CONFIG.high_pass_cutoff)
+        doppler_block.set_threshold_db(CONFIG.live_threshold_db)
+        tb.trigger_block.set_threshold_db(CONFIG.software_trigger_threshold_db)
+        tb.trigger_block.set_holdoff(CONFIG.software_trigger_holdoff)
+        return True
+
+    def disarm(self):
+        print("Disarming radar...")
+        # wake a save thread that is still waiting for a trigger
+        self.disarm_event.set()
+        self.trigger_event.set()
+        if self.tb is not None:
+            self.tb.trigger_block.set_enabled(False)
+            # cut a pending post-trigger wait short, saving what has been recorded
+            self.tb.queue_block.freeze()
+        if not CONFIG.persistent_session:
+            self.close_session()
         return True
 
     def arm(self):
@@ -66,14 +306,21 @@ class RADAR_TOP:
         # GPIO.setup(37, GPIO.IN, pull_up_down=GPIO.PUD_DOWN)
 
         # Start the radar and buffer saving process
-        top_block_cls = RADAR
-        self.tb = top_block_cls()
+        self.trigger_event.clear()
+        self.disarm_event.clear()
+        self.armed_at = time.monotonic()
         print("Arming radar...")
 
-        # Start the radar in a separate thread
-        radar_thread = threading.Thread(target=self.start_radar, args=())
-        radar_thread.daemon = True  # Ensures the thread exits when the main program exits
-        radar_thread.start()
+        if self.session_open() and not self.tb.matches_config():
+            # the capture chain's decimation and DC blocker are fixed when it is built
+            self.close_session()
+        if self.session_open():
+            # flowgraph is already streaming, only the capture needs restarting
+            self.reset_capture()
+            self.tb.doppler_block.reset()
+        else:
+            self.open_session()
+        self.tb.trigger_block.set_enabled(CONFIG.software_trigger)
         
         # Start saving the buffer in a separate thread after 1 second
         save_thread = threading.Thread(target=self.save_buffer, args=())
@@ -82,4 +329,3 @@ class RADAR_TOP:
         save_thread.join()  # Wait for save thread to finish before exiting
         print("Exiting program...")
         return True
-
@@ -0,0 +1,74 @@
+import argparse
+import threading
+import time
+from config import CONFIG
+from radar_top import RADAR_TOP
+
+# Runs the acquisition path on a saved or synthetic capture instead of the SDR, e.g.
+#   python replay.py synthetic.bin --no-throttle --trigger-after 3
+# The flowgraph is built exactly as for the radar, with the LimeSDR source and sink swapped
+# for a file source and a null sink, and the arm/trigger/save path is driven as the GUI
+# would. The sample rate the stream actually sustains is printed every second.
+
+
+def stream_position(radar):
+    """Stream samples that have reached the capture buffer since the flowgraph started, before its decimation."""
+    return radar.tb.queue_block.nitems_read(0) * radar.tb.get_decimation1()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a capture through the radar flowgraph.")
+    parser.add_argument("file_name", help="capture to replay")
+    parser.add_argument("--no-throttle", action="store_true", help="run as fast as the flowgraph can go")
+    parser.add_argument("--no-loop", action="store_true", help="stop at the end of the file")
+    parser.add_argument("--samp-rate", type=float, default=None, help="rate for captures without a header, in Hz")
+    parser.add_argument("--duration", type=float, default=10.0, help="how long to run, in s (default: 10)")
+    parser.add_argument("--trigger-after", type=float, default=None, help="trigger a capture this many seconds after arming")
+    parser.add_argument("--output", default="replay.bin", help="file for a triggered capture (default: replay.bin)")
+    args = parser.parse_args(argv)
+
+    CONFIG.replay_file = args.file_name
+    CONFIG.replay_throttle = not args.no_throttle
+    CONFIG.replay_loop = not args.no_loop
+    CONFIG.file_name = args.output
+    if args.samp_rate is not None:
+        CONFIG.samp_rate = int(args.samp_rate)
+
+    radar = RADAR_TOP()
+    arm_thread = threading.Thread(target=radar.arm, daemon=True)
+    arm_thread.start()
+    while radar.tb is None:
+        time.sleep(0.01)
+    samp_rate = radar.tb.get_samp_rate()
+    print(f"Replaying {args.file_name} at {samp_rate / 1e6:g} MS/s ({'throttled' if CONFIG.replay_throttle else 'unthrottled'})")
+
+    start = time.perf_counter()
+    last_time, last_position = start, 0
+    triggered = False
+    while time.perf_counter() - start < args.duration:
+        time.sleep(1.0)
+        now, position = time.perf_counter(), stream_position(radar)
+        rate = (position - last_position) / (now - last_time)
+        deficit = samp_rate * (now - start) - position
+        print(f"{now - start:6.1f} s  {rate / 1e6:7.2f} MS/s ({rate / samp_rate:5.1%} of real time)  behind real time by {max(deficit, 0):,.0f} samples")
+        last_time, last_position = now, position
+
+        if args.trigger_after is not None and not triggered and now - start >= args.trigger_after:
+            radar.trigger(source="replay")
+            triggered = True
+        if triggered and radar.save_done.is_set():
+            print(f"Capture saved to {CONFIG.file_name}")
+            break
+
+    elapsed = time.perf_counter() - start
+    position = stream_position(radar)
+    print(f"Sustained {position / elapsed / 1e6:.2f} MS/s over {elapsed:.1f} s ({position / elapsed / samp_rate:.1%} of real time)")
+
+    radar.disarm()
+    radar.close_session()
+    arm_thread.join(timeout=5)
+    radar.writer.wait()
+
+
+if __name__ == "__main__":
+    main()
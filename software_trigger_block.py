@@ -0,0 +1,103 @@
+import numpy as np
+from gnuradio import gr
+import threading
+from scipy.signal import sosfilt
+from process_data import chebyshev_highpass_sos
+
+class software_trigger(gr.sync_block):
+    """
+    Fires a trigger when band-limited Doppler energy rises above the noise floor.
+
+    The input is high-passed to strip carrier leakage and clutter, then cut into hops of
+    hop_time seconds. Each hop's mean power is compared to a running noise-floor estimate
+    (quick to follow the power down, slow to follow it up, and never raised by a hop that
+    is over the threshold); a hop threshold_db above it calls
+    callback(offset), where offset is the stream position of the hop. After firing, the
+    block stays quiet for holdoff seconds. Nothing fires until the floor has settled. While
+    the block is disabled it only consumes its input; enabling it starts the filter and the
+    floor estimate afresh.
+    """
+    def __init__(self, samp_rate=3000000, cutoff_freq=750, threshold_db=12, holdoff=2.0, hop_time=0.001, callback=None):
+        gr.sync_block.__init__(self,
+            name="Software Trigger",
+            in_sig=[np.complex64],
+            out_sig=None)
+
+        self.lock = threading.Lock()
+        self.cutoff_freq = cutoff_freq
+        self.threshold_db = threshold_db
+        self.holdoff = holdoff
+        self.hop_time = hop_time
+        self.callback = callback
+        self.enabled = False
+        self.floor_alpha = 0.01   # weight of each quiet hop when the floor rises
+        self.floor_decay = 0.5    # weight of each hop when the floor falls
+        self.warmup_hops = 100    # hops averaged before the floor is trusted
+        self.set_samp_rate(samp_rate)
+
+    def set_samp_rate(self, samp_rate):
+        with self.lock:
+            self.samp_rate = samp_rate
+            self.hop = max(1, int(self.hop_time * samp_rate))
+            self.sos = chebyshev_highpass_sos(self.cutoff_freq, samp_rate)
+            self._restart()
+
+    def _restart(self):
+        # filter state and floor estimate start over; call with the lock held
+        self.zi = np.zeros((self.sos.shape[0], 2), dtype=np.complex128)
+        self.partial = np.zeros(0, dtype=np.float64)
+        self.floor = None
+        self.hops_seen = 0
+        self.quiet_until = 0
+
+    def set_threshold_db(self, threshold_db):
+        self.threshold_db = threshold_db
+
+    def set_holdoff(self, holdoff):
+        self.holdoff = holdoff
+
+    def set_enabled(self, enabled):
+        with self.lock:
+            if enabled and not self.enabled:
+                # the floor has not been tracked while disabled, warm it up again
+                self._restart()
+            self.enabled = enabled
+
+    def work(self, input_items, output_items):
+        in_data = input_items[0]
+        n = len(in_data)
+        fired = None
+        if not self.enabled:
+            return n
+
+        with self.lock:
+            filtered, self.zi = sosfilt(self.sos, in_data, zi=self.zi)
+            power = np.concatenate((self.partial, np.abs(filtered) ** 2))
+
+            # stream position of power[0], samples from earlier calls included
+            first = self.nitems_read(0) + n - len(power)
+            n_hops = len(power) // self.hop
+            energy = power[:n_hops * self.hop].reshape(n_hops, self.hop).mean(axis=1)
+            self.partial = power[n_hops * self.hop:]
+
+            ratio = 10 ** (self.threshold_db / 10)
+            for i, e in enumerate(energy):
+                offset = first + i * self.hop
+                if self.floor is None:
+                    self.floor = e
+                loud = e > self.floor * ratio
+                if (loud and fired is None and self.hops_seen >= self.warmup_hops
+                        and offset >= self.quiet_until):
+                    fired = offset
+                    self.quiet_until = offset + int(self.holdoff * self.samp_rate)
+                if e < self.floor:
+                    self.floor += self.floor_decay * (e - self.floor)
+                elif not loud:
+                    self.floor += self.floor_alpha * (e - self.floor)
+                self.hops_seen += 1
+
+        if fired is not None and self.callback is not None:
+            print(f"Software trigger at sample {fired}")
+            self.callback(fired)
+
+        return n
@@ -0,0 +1,125 @@
+import argparse
+import numpy as np
+from config import CONFIG
+from capture import capture_metadata, write_capture_header
+from process_data import velocity_to_doppler
+
+# Synthetic captures for exercising process_data without the SDR or a range:
+#   python synthetic_capture.py synthetic.bin --velocity 300 --samp-rate 6e6 --duration 4
+
+
+def synthetic_signal(velocity, samp_rate, duration, shot_time=None, shot_duration=0.05, carrier_freq=None,
+                     snr_db=20, leakage=0.5, noise=0.01, start=0, stop=None, seed=0):
+    """
+    Mixer output for a projectile passing the radar at a constant velocity.
+
+    The projectile is a complex tone at its Doppler frequency, present for shot_duration
+    seconds from shot_time with a Hann-shaped amplitude as it enters and leaves the beam.
+    Carrier leakage is a constant offset of amplitude `leakage` with a slow phase wander,
+    and receiver noise is complex Gaussian with standard deviation `noise`.
+
+    Samples [start, stop) of the capture are generated, so long captures can be produced
+    in blocks; the noise is seeded per block so any block is reproducible on its own.
+
+    Args:
+        velocity (float): Projectile velocity (in m/s).
+        samp_rate (float): Sampling rate (in Hz).
+        duration (float): Length of the whole capture (in s).
+        shot_time (float, optional): When the projectile enters the beam (in s). Defaults to mid-capture.
+        shot_duration (float, optional): Time the projectile stays in the beam (in s). Defaults to 0.05.
+        carrier_freq (float, optional): Radar carrier frequency (in Hz). Defaults to CONFIG.carrier_freq.
+        snr_db (float, optional): Projectile power over the noise power (in dB). Defaults to 20.
+        leakage (float, optional): Carrier leakage amplitude. Defaults to 0.5.
+        noise (float, optional): Noise standard deviation. Defaults to 0.01.
+        start (int, optional): First sample to generate. Defaults to 0.
+        stop (int, optional): Sample to stop at. Defaults to the end of the capture.
+        seed (int, optional): Noise seed. Defaults to 0.
+
+    Returns:
+        ndarray: complex64 samples.
+    """
+    n_total = int(round(samp_rate * duration))
+    if stop is None:
+        stop = n_total
+    if shot_time is None:
+        shot_time = duration / 2 - shot_duration / 2
+
+    t = np.arange(start, stop) / samp_rate
+    rng = np.random.default_rng([seed, start])
+
+    signal = noise / np.sqrt(2) * (rng.standard_normal(len(t)) + 1j * rng.standard_normal(len(t)))
+    signal += leakage * np.exp(0.2j * np.sin(2 * np.pi * 0.5 * t))
+
+    in_beam = (t >= shot_time) & (t < shot_time + shot_duration)
+    if np.any(in_beam):
+        amplitude = noise * 10 ** (snr_db / 20)
+        envelope = np.sin(np.pi * (t[in_beam] - shot_time) / shot_duration) ** 2
+        doppler = velocity_to_doppler(velocity, carrier_freq)
+        signal[in_beam] += amplitude * envelope * np.exp(2j * np.pi * doppler * t[in_beam])
+
+    return signal.astype(np.complex64)
+
+
+def write_synthetic_capture(file_name, velocity, samp_rate=None, duration=4.0, block_size=1 << 22, raw=False, **kwargs):
+    """
+    Writes a synthetic capture in the format the radar saves (header plus complex64
+    payload), block by block so memory use does not grow with duration.
+
+    Args:
+        file_name (str): Output file.
+        velocity (float): Projectile velocity (in m/s).
+        samp_rate (float, optional): Sampling rate (in Hz). Defaults to CONFIG.samp_rate.
+        duration (float, optional): Capture length (in s). Defaults to 4.
+        block_size (int, optional): Samples generated per block.
+        raw (bool, optional): Write a legacy headerless capture. Defaults to False.
+        **kwargs: Passed on to synthetic_signal.
+
+    Returns:
+        dict: The capture's metadata, with the true velocity and shot time added.
+    """
+    if samp_rate is None:
+        samp_rate = CONFIG.samp_rate
+    n_samples = int(round(samp_rate * duration))
+    shot_time = kwargs.pop("shot_time", None)
+    shot_duration = kwargs.get("shot_duration", 0.05)
+    if shot_time is None:
+        shot_time = duration / 2 - shot_duration / 2
+
+    metadata = capture_metadata(trigger_index=int(shot_time * samp_rate), n_samples=n_samples)
+    metadata["samp_rate"] = samp_rate
+    metadata["carrier_freq"] = kwargs.get("carrier_freq") or CONFIG.carrier_freq
+    metadata["synthetic"] = {"velocity": velocity, "shot_time": shot_time, "shot_duration": shot_duration}
+
+    with open(file_name, "wb") as f:
+        if not raw:
+            write_capture_header(f, metadata)
+        for start in range(0, n_samples, block_size):
+            stop = min(start + block_size, n_samples)
+            synthetic_signal(velocity, samp_rate, duration, shot_time, start=start, stop=stop, **kwargs).tofile(f)
+
+    return metadata
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic radar capture.")
+    parser.add_argument("file_name", help="output capture file")
+    parser.add_argument("--velocity", type=float, default=300, help="projectile velocity in m/s (default: 300)")
+    parser.add_argument("--samp-rate", type=float, default=CONFIG.samp_rate, help="sampling rate in Hz")
+    parser.add_argument("--duration", type=float, default=4.0, help="capture length in s (default: 4)")
+    parser.add_argument("--shot-time", type=float, default=None, help="when the projectile enters the beam, in s")
+    parser.add_argument("--shot-duration", type=float, default=0.05, help="time in the beam, in s (default: 0.05)")
+    parser.add_argument("--snr", type=float, default=20, help="projectile SNR in dB (default: 20)")
+    parser.add_argument("--leakage", type=float, default=0.5, help="carrier leakage amplitude (default: 0.5)")
+    parser.add_argument("--noise", type=float, default=0.01, help="noise standard deviation (default: 0.01)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw", action="store_true", help="write a legacy capture without a header")
+    args = parser.parse_args(argv)
+
+    write_synthetic_capture(args.file_name, args.velocity, args.samp_rate, args.duration, raw=args.raw,
+                            shot_time=args.shot_time, shot_duration=args.shot_duration, snr_db=args.snr,
+                            leakage=args.leakage, noise=args.noise, seed=args.seed)
+    print(f"Wrote {args.file_name}: {args.velocity} m/s, {args.samp_rate / 1e6:g} MS/s, {args.duration} s")
+
+
+if __name__ == "__main__":
+    main()
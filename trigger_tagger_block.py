@@ -0,0 +1,46 @@
+import numpy as np
+from gnuradio import gr
+import pmt
+import threading
+
+class trigger_tagger(gr.sync_block):
+    """
+    Pass-through block that stamps triggers onto the sample stream as "trigger" tags.
+
+    fire() may be called from any thread. The tag goes on the first sample of the next
+    work() call, so a manual or serial trigger lands where it entered the flowgraph rather
+    than wherever the saving thread happened to wake up. A trigger detected further
+    downstream (the software trigger) passes the stream offset it detected, which is
+    carried in the tag's value; the tag's own position is only when it was applied.
+    The tag's srcid names the trigger source.
+    """
+    def __init__(self):
+        gr.sync_block.__init__(self,
+            name="Trigger Tagger",
+            in_sig=[np.complex64],
+            out_sig=[np.complex64])
+
+        self.trigger_key = pmt.intern("trigger")
+        self.lock = threading.Lock()
+        self.pending = []  # (offset or None, source) waiting for the next work() call
+
+    def fire(self, offset=None, source="manual"):
+        """Queues a trigger tag; offset is an absolute stream offset, None for "now"."""
+        with self.lock:
+            self.pending.append((offset, source))
+
+    def work(self, input_items, output_items):
+        in_data = input_items[0]
+        n = len(in_data)
+        output_items[0][:] = in_data
+
+        with self.lock:
+            pending, self.pending = self.pending, []
+
+        now = self.nitems_written(0)
+        for offset, source in pending:
+            if offset is None:
+                offset = now
+            self.add_item_tag(0, now, self.trigger_key, pmt.from_uint64(int(offset)), pmt.intern(source))
+
+        return n